@@ -0,0 +1,166 @@
+"""
+Validate the esp32 discovery scanner against fake devices on loopback.
+
+Starts a fake ESP32 /status server and a few decoy HTTP servers on
+127.0.0.x addresses, then scans 127.0.0.1-254 on that port. discover() is
+run against a temporary known-ips file, once with the camera's address
+persisted and once with a stale one.
+
+    python -m benchmarks.discovery --camera 127.0.0.200 --concurrency 32
+"""
+
+import argparse
+import json
+from pathlib import Path
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from core import discovery
+
+ESP32_STATUS = {
+    "xclk": 20,
+    "pixformat": 4,
+    "framesize": 14,
+    "quality": 10,
+    "brightness": 0,
+    "contrast": 0,
+    "saturation": 0,
+    "sharpness": 0,
+    "special_effect": 0,
+    "wb_mode": 0,
+    "awb": 1,
+    "awb_gain": 1,
+    "aec": 1,
+    "aec2": 0,
+    "ae_level": 0,
+    "aec_value": 168,
+    "agc": 1,
+    "agc_gain": 0,
+    "gainceiling": 0,
+    "bpc": 0,
+    "wpc": 1,
+    "raw_gma": 1,
+    "lenc": 1,
+    "hmirror": 0,
+    "dcw": 1,
+    "colorbar": 0,
+    "led_intensity": 0,
+    "servo_angle": 0,
+}
+
+
+def make_handler(body: dict, delay: float = 0):
+    payload = json.dumps(body).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        # keep-alive like the firmware's server, so probes cannot wait for EOF
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(delay)
+            self.send_response(200 if self.path == "/status" else 404)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
+
+
+def serve(ip: str, port: int, handler):
+    server = ThreadingHTTPServer((ip, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check_discover(known_path: Path, camera: str, stale: str, args):
+    # discover() with a persisted address: no subnet scan when it still
+    # answers, a fall-through to the scan when it does not
+    scans = []
+    real_scan, real_path = discovery.scan, discovery.esp32_ips_path
+
+    async def counting_scan(ips, *a, **kw):
+        ips = list(ips)
+        scans.append(ips)
+        return await real_scan(ips, *a, **kw)
+
+    discovery.esp32_ips_path = known_path
+    discovery.scan = counting_scan
+    try:
+        ips = discovery.subnet_ips(camera)
+        for persisted, expected_scans in ((camera, 1), (stale, 2)):
+            known_path.write_text(json.dumps([persisted]))
+            scans.clear()
+            start = time.perf_counter()
+            found = discovery.asyncio.run(
+                discovery.discover(args.port, args.concurrency, args.timeout, ips)
+            )
+            elapsed = time.perf_counter() - start
+            print(
+                f"discover, {persisted} persisted: {found} in {elapsed * 1e3:.0f} ms,"
+                f" {len(scans)} scan(s)"
+            )
+            assert found == camera, f"expected {camera}, got {found}"
+            assert len(scans) == expected_scans and scans[0] == [persisted]
+            assert json.loads(known_path.read_text())[0] == camera
+    finally:
+        discovery.scan, discovery.esp32_ips_path = real_scan, real_path
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Discovery scan against fake devices")
+    ap.add_argument("--camera", default="127.0.0.200")
+    ap.add_argument("--decoys", default="127.0.0.2,127.0.0.50,127.0.0.201")
+    ap.add_argument("--port", type=int, default=18080)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--timeout", type=float, default=0.5)
+    args = ap.parse_args()
+
+    servers = [serve(args.camera, args.port, make_handler(ESP32_STATUS, delay=0.05))]
+    for ip in args.decoys.split(","):
+        # a router-like device answering /status with other json
+        servers.append(
+            serve(ip, args.port, make_handler({"status": "ok", "uptime": 1}))
+        )
+
+    ips = discovery.subnet_ips(args.camera)
+
+    start = time.perf_counter()
+    found = discovery.asyncio.run(
+        discovery.scan(ips, args.port, args.concurrency, args.timeout)
+    )
+    elapsed = time.perf_counter() - start
+    print(f"subnet scan: {found} in {elapsed * 1e3:.0f} ms")
+    assert found == args.camera, f"expected {args.camera}, got {found}"
+
+    start = time.perf_counter()
+    found = discovery.asyncio.run(
+        discovery.scan([args.camera] + ips, args.port, args.concurrency, args.timeout)
+    )
+    elapsed = time.perf_counter() - start
+    print(f"known ip first: {found} in {elapsed * 1e3:.0f} ms")
+    assert found == args.camera
+
+    missing = discovery.asyncio.run(
+        discovery.scan(
+            args.decoys.split(","), args.port, args.concurrency, args.timeout
+        )
+    )
+    print(f"decoys only: {missing}")
+    assert missing is None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        check_discover(
+            Path(tmp) / "esp32_ips.json", args.camera, args.decoys.split(",")[0], args
+        )
+
+    for server in servers:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
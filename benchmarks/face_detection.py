@@ -0,0 +1,107 @@
+"""
+Per-frame latency and recall of the face detection backends on a fixed set of
+local images.
+
+Put test images in a folder, optionally with a ``labels.json`` mapping file
+names to face boxes ``[[left, top, right, bottom], ...]``. With labels, recall
+is the share of labelled faces matched at IoU >= 0.5; without, every image is
+assumed to hold at least one face and recall is the share of images with a
+detection.
+
+    python -m benchmarks.face_detection --images test_faces --width 640
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+from core.face_detection import DETECTORS, create_face_detector
+from models.helpers import Box
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+def load_images(folder: Path, width: int):
+    labels = {}
+    if (folder / "labels.json").is_file():
+        labels = json.loads((folder / "labels.json").read_text())
+
+    images = []
+    for path in sorted(folder.iterdir()):
+        if path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        img = cv2.imread(str(path))
+        if img is None:
+            continue
+        scale = width / img.shape[1] if width else 1
+        if scale != 1:
+            img = cv2.resize(
+                img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+            )
+        boxes = [
+            Box(left=l, top=t, right=r, bottom=b).scale_copy(scale)
+            for l, t, r, b in labels.get(path.name, [])
+        ]
+        images.append((path.name, cv2.cvtColor(img, cv2.COLOR_BGR2RGB), boxes))
+    return images, bool(labels)
+
+
+def bench(name: str, images, labelled: bool, max_faces: int, repeat: int):
+    detector = create_face_detector(name, max_num_faces=max_faces)
+    latencies = []
+    hits = total = 0
+
+    for _, img, truth in images:
+        detector.detect(img)  # warm up / let tracking modes settle
+        for _ in range(repeat):
+            start = time.perf_counter()
+            boxes, _ = detector.detect(img)
+            latencies.append(time.perf_counter() - start)
+
+        if labelled:
+            total += len(truth)
+            hits += sum(any(t.match_percentage(b) >= 0.5 for b in boxes) for t in truth)
+        else:
+            total += 1
+            hits += bool(boxes)
+
+    ms = np.array(latencies) * 1e3
+    recall = hits / total if total else float("nan")
+    print(
+        f"{name:<18} mean {ms.mean():7.2f} ms  p95 {np.percentile(ms, 95):7.2f} ms  "
+        f"recall {recall:6.1%} ({hits}/{total})"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Face detection backend latency and recall"
+    )
+    ap.add_argument("--images", type=Path, required=True)
+    ap.add_argument(
+        "--width",
+        type=int,
+        default=640,
+        help="resize images to this width, 0 keeps size",
+    )
+    ap.add_argument("--backends", default=",".join(DETECTORS))
+    ap.add_argument("--max-faces", type=int, default=3)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    images, labelled = load_images(args.images, args.width)
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+    print(f"{len(images)} images, {'labelled' if labelled else 'unlabelled'}")
+
+    for name in args.backends.split(","):
+        try:
+            bench(name, images, labelled, args.max_faces, args.repeat)
+        except Exception as e:
+            print(f"{name:<18} failed: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Face encoding latency with and without reusing the detector's landmarks.
+
+"dlib" is face_recognition.face_encodings on the detected box (runs dlib's
+shape predictor first); "landmarks" aligns the chip from the detector's
+landmarks and calls the encoder directly. The distance column shows how far
+the two embeddings of the same face are apart (match tolerance is ~0.6).
+
+    python -m benchmarks.face_encoding --images test_faces --detector mediapipe
+"""
+
+import argparse
+import time
+from pathlib import Path
+import cv2
+import face_recognition
+import numpy as np
+from core.face_detection import create_face_detector
+from core.face_encoding import encode_face
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+def timed(fn, repeat: int):
+    out = fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return out, (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Encode latency with and without reused landmarks"
+    )
+    ap.add_argument("--images", type=Path, required=True)
+    ap.add_argument("--detector", default="mediapipe")
+    ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--repeat", type=int, default=10)
+    args = ap.parse_args()
+
+    detector = create_face_detector(args.detector, max_num_faces=1)
+    dlib_ms, lm_ms, distances = [], [], []
+
+    for path in sorted(args.images.iterdir()):
+        if path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        img = cv2.imread(str(path))
+        if img is None:
+            continue
+        if args.width:
+            img = cv2.resize(
+                img, None, fx=args.width / img.shape[1], fy=args.width / img.shape[1]
+            )
+        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+        _, boxes, landmarks = detector(rgb)
+        if not boxes or landmarks[0] is None:
+            print(f"{path.name}: no face/landmarks, skipped")
+            continue
+        box, lm = boxes[0], landmarks[0]
+
+        full, t_full = timed(lambda: encode_face(rgb, box), args.repeat)
+        fast, t_fast = timed(lambda: encode_face(rgb, box, lm), args.repeat)
+        if full is None or fast is None:
+            print(f"{path.name}: encoding failed, skipped")
+            continue
+
+        distance = face_recognition.face_distance([full], fast)[0]
+        dlib_ms.append(t_full)
+        lm_ms.append(t_fast)
+        distances.append(distance)
+        print(
+            f"{path.name:<30} dlib {t_full:7.2f} ms  landmarks {t_fast:7.2f} ms  distance {distance:.3f}"
+        )
+
+    if dlib_ms:
+        print(
+            f"{'mean':<30} dlib {np.mean(dlib_ms):7.2f} ms  landmarks {np.mean(lm_ms):7.2f} ms  "
+            f"distance {np.mean(distances):.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
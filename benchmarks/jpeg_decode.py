@@ -0,0 +1,76 @@
+"""
+Per-frame decode + resize cost for the old fixed IMREAD_REDUCED_COLOR_2 path
+against decode-time scaling picked from the source and target widths.
+
+    python -m benchmarks.jpeg_decode --target 640
+"""
+
+import argparse
+import time
+import cv2
+import numpy as np
+from core.mjpeg import decode_jpeg, fit_width
+
+SIZES = {
+    "VGA": (640, 480),
+    "SVGA": (800, 600),
+    "HD": (1280, 720),
+    "SXGA": (1280, 1024),
+    "UXGA": (1600, 1200),
+    "FHD": (1920, 1080),
+}
+
+
+def make_jpeg(width: int, height: int, quality: int = 80) -> bytes:
+    rng = np.random.default_rng(0)
+    base = np.linspace(0, 255, width, dtype=np.uint8)[None, :, None]
+    img = np.broadcast_to(base, (height, width, 3)).copy()
+    img += rng.integers(0, 32, img.shape, dtype=np.uint8)
+    return cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])[
+        1
+    ].tobytes()
+
+
+def old_path(jpg: bytes, target_width: int):
+    frame = cv2.imdecode(np.frombuffer(jpg, np.uint8), cv2.IMREAD_REDUCED_COLOR_2)
+    return cv2.resize(frame, (640, 360), interpolation=cv2.INTER_NEAREST)
+
+
+def full_path(jpg: bytes, target_width: int):
+    return fit_width(
+        cv2.imdecode(np.frombuffer(jpg, np.uint8), cv2.IMREAD_COLOR), target_width
+    )
+
+
+def scaled_path(jpg: bytes, target_width: int):
+    return fit_width(decode_jpeg(jpg, target_width), target_width)
+
+
+def bench(fn, jpg, target_width, repeat):
+    fn(jpg, target_width)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        out = fn(jpg, target_width)
+    return (time.perf_counter() - start) / repeat * 1e3, out.shape
+
+
+def main():
+    ap = argparse.ArgumentParser(description="JPEG decode + resize cost per frame size")
+    ap.add_argument(
+        "--target", type=int, default=640, help="frame width the pipeline asks for"
+    )
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    print(f"{'size':<6}{'old (1/2 + resize)':>24}{'full + resize':>24}{'scaled':>24}")
+    for name, (w, h) in SIZES.items():
+        jpg = make_jpeg(w, h)
+        cols = []
+        for fn in (old_path, full_path, scaled_path):
+            ms, shape = bench(fn, jpg, args.target, args.repeat)
+            cols.append(f"{ms:7.2f} ms {shape[1]}x{shape[0]}")
+        print(f"{name:<6}" + "".join(f"{c:>24}" for c in cols))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Liveness throughput scoring the faces of a frame one session run per face
+versus one batched run (LivenessDetection.batch).
+
+    python -m benchmarks.liveness_batch --faces 1,3,8
+"""
+
+import argparse
+import time
+import numpy as np
+from core.face_liveness import LivenessDetection
+from utils.constants import deepPix_checkpoint_path
+
+
+def timed(fn, repeat: int) -> float:
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-face vs batched liveness inference")
+    ap.add_argument("--faces", default="1,3,8")
+    ap.add_argument("--repeat", type=int, default=10)
+    args = ap.parse_args()
+
+    model = LivenessDetection(deepPix_checkpoint_path.as_posix())
+    print(f"batch axis: {'dynamic' if model.max_batch is None else model.max_batch}")
+
+    rng = np.random.default_rng(0)
+    for n in [int(x) for x in args.faces.split(",")]:
+        faces = [rng.integers(0, 256, (160, 160, 3), dtype=np.uint8) for _ in range(n)]
+        single = timed(lambda: [model(f) for f in faces], args.repeat)
+        batched = timed(lambda: model.batch(faces), args.repeat)
+        print(
+            f"{n} faces  per-face {single * 1e3:7.1f} ms ({n / single:5.1f} faces/s)  "
+            f"batched {batched * 1e3:7.1f} ms ({n / batched:5.1f} faces/s)  "
+            f"{single / batched:4.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Checks that core.face_liveness.preprocess matches the torchvision transform
+the liveness model used to be fed with, and times both.
+
+torchvision/Pillow are only needed to run this comparison. With the DeepPixBiS
+checkpoint present, liveness scores from both inputs are compared as well.
+
+    python -m benchmarks.liveness_preprocess --images test_faces
+"""
+
+import argparse
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+from core.face_liveness import INPUT_SIZE, SCALE, LivenessDetection, preprocess
+from utils.constants import deepPix_checkpoint_path
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+def load_faces(folder, sizes):
+    # face crops arrive as RGB arrays of assorted sizes
+    faces = []
+    if folder is not None:
+        for path in sorted(Path(folder).iterdir()):
+            if path.suffix.lower() in IMAGE_SUFFIXES:
+                img = cv2.imread(str(path))
+                if img is not None:
+                    faces.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    if not faces:
+        rng = np.random.default_rng(0)
+        base = cv2.GaussianBlur(
+            rng.integers(0, 256, (512, 512, 3), dtype=np.uint8), (0, 0), 3
+        )
+        faces = [base]
+    return [
+        cv2.resize(f, (s, s), interpolation=cv2.INTER_AREA)
+        for f in faces
+        for s in sizes
+    ]
+
+
+def torchvision_transform():
+    from PIL import Image
+    from torchvision import transforms as T
+
+    trans = T.Compose(
+        [
+            T.Resize((INPUT_SIZE, INPUT_SIZE)),
+            T.ToTensor(),
+            T.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+        ]
+    )
+
+    def run(face_arr):
+        face_rgb = cv2.cvtColor(face_arr, cv2.COLOR_BGR2RGB)
+        return trans(Image.fromarray(face_rgb)).unsqueeze(0).numpy()  # type: ignore
+
+    return run
+
+
+def timed(fn, faces, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for f in faces:
+            fn(f)
+    return (time.perf_counter() - start) / (repeat * len(faces)) * 1e3
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Liveness preprocessing parity and speed")
+    ap.add_argument("--images", type=Path)
+    ap.add_argument(
+        "--sizes",
+        default="160,300",
+        help="crop sizes; the pipeline feeds 160, 300 covers the downscale path",
+    )
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    faces = load_faces(args.images, [int(s) for s in args.sizes.split(",")])
+    reference = torchvision_transform()
+    buf = np.empty((1, 3, INPUT_SIZE, INPUT_SIZE), dtype=np.float32)
+
+    worst = 0.0
+    for f in faces:
+        preprocess(f, buf[0])
+        # SCALE is one grey level of each channel after normalization
+        levels = float((np.abs(buf - reference(f)) / SCALE).max())
+        worst = max(worst, levels)
+        assert levels <= 1 + 1e-3, f"{f.shape[0]}px crop off by {levels:.2f} levels"
+    print(f"{len(faces)} crops, max abs difference {worst:.2f} grey levels")
+
+    ms_ref = timed(reference, faces, args.repeat)
+    ms_np = timed(lambda f: preprocess(f, buf[0]), faces, args.repeat)
+    print(
+        f"torchvision {ms_ref:6.3f} ms/face   numpy {ms_np:6.3f} ms/face   "
+        f"{ms_ref / ms_np:4.1f}x"
+    )
+
+    if deepPix_checkpoint_path.is_file():
+        model = LivenessDetection(deepPix_checkpoint_path.as_posix())
+        diffs = []
+        for f in faces:
+            new = model(f)
+            outputs = dict(
+                zip(
+                    model.deepPix.output_names,
+                    model.deepPix.run({"input": reference(f)}),
+                )
+            )
+            old = (
+                np.mean(outputs["output_pixel"]) + np.mean(outputs["output_binary"])
+            ) / 2.0
+            diffs.append(abs(new - old))
+        print(f"liveness score max difference {max(diffs):.5f}")
+    else:
+        print(f"{deepPix_checkpoint_path} missing, skipping score comparison")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Microbenchmark for the MJPEG stream parser.
+
+Feeds recorded stream bytes through the legacy find/slice parser and through
+``core.mjpeg.MJPEGParser`` in fixed-size chunks.
+
+    python -m benchmarks.mjpeg_parser                      # synthetic SXGA stream
+    python -m benchmarks.mjpeg_parser --record http://192.168.0.52:81/stream
+    python -m benchmarks.mjpeg_parser --recording stream.bin --decode
+"""
+
+import argparse
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+import requests
+from core.mjpeg import MJPEGParser
+
+BOUNDARY = b"123456789000000000000987654321"
+
+
+def synthesize(frames: int, width: int, height: int, quality: int = 80) -> bytes:
+    # Same part layout as _STREAM_BOUNDARY/_STREAM_PART in arduino/app_httpd.cpp
+    rng = np.random.default_rng(0)
+    base = np.linspace(0, 255, width, dtype=np.uint8)[None, :, None]
+    out = bytearray()
+    for i in range(frames):
+        img = np.broadcast_to(base, (height, width, 3)).copy()
+        img += rng.integers(0, 32, img.shape, dtype=np.uint8)
+        ok, jpg = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        assert ok
+        out += b"\r\n--" + BOUNDARY + b"\r\n"
+        out += (
+            f"Content-Type: image/jpeg\r\nContent-Length: {len(jpg)}\r\n"
+            f"X-Timestamp: {i}.000000\r\n\r\n"
+        ).encode()
+        out += jpg.tobytes()
+    return bytes(out)
+
+
+def record(url: str, seconds: float, path: Path):
+    end = time.time() + seconds
+    with requests.get(url, stream=True, timeout=5) as response, open(path, "wb") as f:
+        for chunk in response.iter_content(chunk_size=None):
+            f.write(chunk)
+            if time.time() > end:
+                break
+    print(f"Recorded {path.stat().st_size} bytes to {path}")
+
+
+def legacy_parse(data: bytes, chunk_size: int, decode: bool) -> int:
+    # The parser get_video_feed used before the stream reader
+    count = 0
+    bytes_array = bytearray(b"")
+    for i in range(0, len(data), chunk_size):
+        bytes_array.extend(data[i : i + chunk_size])
+        a = bytes_array.find(b"\xff\xd8")
+        b = bytes_array.find(b"\xff\xd9")
+        if a != -1 and b != -1:
+            jpg = bytes_array[a : b + 2]
+            bytes_array = bytes_array[b + 2 :]
+            if decode:
+                cv2.imdecode(np.frombuffer(jpg, np.uint8), cv2.IMREAD_REDUCED_COLOR_2)
+            count += 1
+    return count
+
+
+def stream_parse(data: bytes, chunk_size: int, decode: bool) -> int:
+    parser = MJPEGParser(BOUNDARY)
+    view = memoryview(data)
+    for i in range(0, len(data), chunk_size):
+        parser.feed(view[i : i + chunk_size])
+        for jpg, _ in parser.frames():
+            if decode:
+                cv2.imdecode(np.frombuffer(jpg, np.uint8), cv2.IMREAD_REDUCED_COLOR_2)
+    return parser.frames_parsed
+
+
+def bench(name, fn, data, chunk_size, decode, repeat):
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = fn(data, chunk_size, decode)
+        best = min(best, time.perf_counter() - start)
+    mb = len(data) / 1e6
+    print(
+        f"{name:<8} chunk={chunk_size:<6} frames={count:<4} "
+        f"{best * 1e3:8.2f} ms  {mb / best:8.1f} MB/s  {best / max(count, 1) * 1e6:8.1f} us/frame"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--recording", type=Path, help="raw stream bytes to replay")
+    ap.add_argument("--record", metavar="URL", help="record a live stream first")
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--frames", type=int, default=60)
+    ap.add_argument("--size", default="1280x1024")
+    ap.add_argument("--chunks", default="1024,8192,65536")
+    ap.add_argument("--decode", action="store_true", help="include cv2.imdecode")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    if args.record:
+        args.recording = args.recording or Path("stream.bin")
+        record(args.record, args.seconds, args.recording)
+
+    if args.recording:
+        data = args.recording.read_bytes()
+    else:
+        width, height = map(int, args.size.split("x"))
+        data = synthesize(args.frames, width, height)
+    print(f"Stream: {len(data) / 1e6:.1f} MB")
+
+    for chunk_size in map(int, args.chunks.split(",")):
+        bench("legacy", legacy_parse, data, chunk_size, args.decode, args.repeat)
+        bench("parser", stream_parse, data, chunk_size, args.decode, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
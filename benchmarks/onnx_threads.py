@@ -0,0 +1,59 @@
+"""
+Liveness model latency per onnxruntime thread setting and optimization
+level, read from OnnxModel's latency histogram. Use it to pick
+onnx_intra_op_threads / onnx_optimization for a host.
+
+    python -m benchmarks.onnx_threads --threads 1,2,4 --batch 1,3
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+from core.face_liveness import INPUT_SIZE
+from core.onnx_runtime import LatencyHistogram, OnnxModel
+from utils.constants import deepPix_checkpoint_path, ort_cache_path
+
+
+def main():
+    ap = argparse.ArgumentParser(description="onnxruntime thread/optimization sweep")
+    ap.add_argument("--model", default=deepPix_checkpoint_path.as_posix())
+    ap.add_argument(
+        "--threads", default=",".join(str(n) for n in (1, 2, os.cpu_count()))
+    )
+    ap.add_argument("--optimization", default="basic,all")
+    ap.add_argument("--batch", default="1")
+    ap.add_argument("--repeat", type=int, default=10)
+    args = ap.parse_args()
+
+    print(f"{os.cpu_count()} cpus")
+    rng = np.random.default_rng(0)
+    for level in args.optimization.split(","):
+        for threads in sorted({int(t) for t in args.threads.split(",")}):
+            start = time.perf_counter()
+            model = OnnxModel(
+                args.model,
+                intra_op_threads=threads,
+                optimization=level,
+                cache_dir=ort_cache_path,
+            )
+            load = time.perf_counter() - start
+            for n in [int(b) for b in args.batch.split(",")]:
+                if isinstance(model.batch_dim, int) and n != model.batch_dim:
+                    continue
+                x = rng.standard_normal(
+                    (n, 3, INPUT_SIZE, INPUT_SIZE), dtype=np.float32
+                )
+                model.run({model.input_names[0]: x})  # warm up
+                model.latency = LatencyHistogram()
+                for _ in range(args.repeat):
+                    model.run({model.input_names[0]: x})
+                stats = model.latency.to_dict()
+                print(
+                    f"{level:<9} threads {threads:>2}  batch {n:>2}  load {load:5.2f} s  "
+                    f"p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+How much face encoding stalls a capture loop when it runs on a thread of
+the camera process versus in RecognitionPool worker processes.
+
+A ticker thread stands in for the capture loop and records how late each
+5 ms tick fires while the same crops are encoded both ways.
+
+    python -m benchmarks.recognition_pool --image face.jpg --jobs 20
+"""
+
+import argparse
+import threading
+import time
+import face_recognition
+import numpy as np
+from core.face_encoding import encode_face
+from core.recognition import PRIORITY_NEW, RecognitionPool
+from models.helpers import Box
+from utils.constants import should_run_thread
+
+TICK = 0.005
+
+
+class Ticker:
+    def __init__(self):
+        self.lateness = []
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        due = time.perf_counter() + TICK
+        while self.running:
+            time.sleep(max(0.0, due - time.perf_counter()))
+            now = time.perf_counter()
+            self.lateness.append(now - due)
+            due = now + TICK
+
+    def stop(self) -> dict:
+        self.running = False
+        self.thread.join()
+        late = np.array(self.lateness) * 1e3
+        return {
+            "ticks": len(late),
+            "p50_ms": round(float(np.percentile(late, 50)), 2),
+            "p99_ms": round(float(np.percentile(late, 99)), 2),
+            "max_ms": round(float(late.max()), 2),
+        }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Capture loop stalls during encoding")
+    ap.add_argument("--image", required=True)
+    ap.add_argument("--jobs", type=int, default=20)
+    ap.add_argument("--workers", type=int, default=1)
+    args = ap.parse_args()
+
+    img = face_recognition.load_image_file(args.image)
+    locations = face_recognition.face_locations(img)
+    if not locations:
+        raise SystemExit(f"No face found in {args.image}")
+    top, right, bottom, left = locations[0]
+    box = Box(top=top, right=right, bottom=bottom, left=left)
+
+    ticker = Ticker()
+    start = time.perf_counter()
+    for _ in range(args.jobs):
+        encode_face(img, box)
+    thread_s = time.perf_counter() - start
+    print(f"in-thread: {args.jobs} encodings in {thread_s:.2f}s", ticker.stop())
+
+    done = threading.Semaphore(0)
+    pool = RecognitionPool(lambda context, encoding: done.release(), args.jobs)
+    runner = threading.Thread(target=pool.run, args=(args.workers,))
+    runner.start()
+    while not pool.running:
+        time.sleep(0.05)
+    pool.submit("warmup", img, box, priority=PRIORITY_NEW)
+    done.acquire()
+
+    ticker = Ticker()
+    start = time.perf_counter()
+    for i in range(args.jobs):
+        pool.submit(str(i), img, box, priority=PRIORITY_NEW)
+    for _ in range(args.jobs):
+        done.acquire()
+    pool_s = time.perf_counter() - start
+    print(
+        f"pool ({args.workers} workers): {args.jobs} encodings in {pool_s:.2f}s",
+        ticker.stop(),
+    )
+    stats = pool.stats()
+    print(
+        "queue_wait p50",
+        stats["queue_wait"]["p50_ms"],
+        "ms, encode p50",
+        stats["encode"]["p50_ms"],
+        "ms, dropped",
+        stats["dropped"],
+    )
+
+    should_run_thread.value = False
+    runner.join()
+
+
+if __name__ == "__main__":
+    main()
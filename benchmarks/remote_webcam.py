@@ -0,0 +1,118 @@
+"""
+Localhost throughput of the legacy pickle remote-webcam path against the
+framed JPEG protocol in core/remote_protocol.py.
+
+    python -m benchmarks.remote_webcam --frames 200 --size 1280x720
+"""
+
+import argparse
+import pickle
+import socket
+import struct
+import threading
+import time
+import cv2
+import numpy as np
+from core.remote_protocol import FrameReceiver, send_frame
+
+
+def make_frames(count: int, width: int, height: int):
+    rng = np.random.default_rng(0)
+    base = np.linspace(0, 255, width, dtype=np.uint8)[None, :, None]
+    frames = []
+    for _ in range(count):
+        img = np.broadcast_to(base, (height, width, 3)).copy()
+        img += rng.integers(0, 32, img.shape, dtype=np.uint8)
+        frames.append(img)
+    return frames
+
+
+def pickle_sender(conn: socket.socket, frames):
+    for frame in frames:
+        data = pickle.dumps(frame)
+        conn.sendall(struct.pack("Q", len(data)) + data)
+
+
+def jpeg_sender(conn: socket.socket, frames, quality: int):
+    for seq, frame in enumerate(frames):
+        send_frame(conn, frame, seq, quality)
+
+
+def pickle_receiver(sock: socket.socket, count: int) -> int:
+    # The receive loop _remote_webcam used before the framed protocol
+    data = b""
+    payload_size = struct.calcsize("Q")
+    received = 0
+    for _ in range(count):
+        while len(data) < payload_size:
+            data += sock.recv(4 * 1024)
+        msg_size = struct.unpack("Q", data[:payload_size])[0]
+        data = data[payload_size:]
+        while len(data) < msg_size:
+            data += sock.recv(4 * 1024)
+        frame_data = data[:msg_size]
+        data = data[msg_size:]
+        pickle.loads(frame_data)
+        received += payload_size + msg_size
+    return received
+
+
+def jpeg_receiver(sock: socket.socket, count: int) -> int:
+    receiver = FrameReceiver(sock)
+    received = 0
+    for _ in range(count):
+        header, frame = receiver.recv_frame()
+        assert frame is not None
+        received += header.length
+    return received
+
+
+def run(name, send, recv, frames):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+
+    def serve():
+        conn, _ = server.accept()
+        with conn:
+            send(conn)
+
+    t = threading.Thread(target=serve, daemon=True)
+    t.start()
+
+    client = socket.create_connection(server.getsockname())
+    start = time.perf_counter()
+    received = recv(client, len(frames))
+    elapsed = time.perf_counter() - start
+    client.close()
+    t.join()
+    server.close()
+
+    print(
+        f"{name:<7} {len(frames) / elapsed:8.1f} fps  {received / elapsed / 1e6:8.1f} MB/s  "
+        f"{received / len(frames) / 1e3:9.1f} KB/frame"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Remote webcam protocol throughput")
+    ap.add_argument("--frames", type=int, default=200)
+    ap.add_argument("--sizes", default="640x480,1280x720")
+    ap.add_argument("--quality", type=int, default=80)
+    args = ap.parse_args()
+
+    for size in args.sizes.split(","):
+        width, height = map(int, size.split("x"))
+        frames = make_frames(args.frames, width, height)
+        print(f"{size}, {args.frames} frames")
+        run("pickle", lambda c: pickle_sender(c, frames), pickle_receiver, frames)
+        run(
+            "jpeg",
+            lambda c: jpeg_sender(c, frames, args.quality),
+            jpeg_receiver,
+            frames,
+        )
+
+
+if __name__ == "__main__":
+    main()
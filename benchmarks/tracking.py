@@ -0,0 +1,131 @@
+"""
+Frame rate of detecting every frame versus detecting every nth frame and
+tracking boxes with optical flow in between (core/tracking.py), on a video
+or on a synthetic clip that pans and zooms across a still image.
+
+Box drift is the mean IoU between the tracked boxes and what the detector
+finds on the same frame.
+
+    python -m benchmarks.tracking --video clip.mp4 --every 1,3,5,10
+    python -m benchmarks.tracking --image face.jpg
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import Optional
+import cv2
+import numpy as np
+from core.face_detection import create_face_detector
+from core.tracking import BoxTracker
+
+
+def load_frames(video: Optional[Path], image: Optional[Path], count: int, width: int):
+    frames = []
+    if video is not None:
+        cap = cv2.VideoCapture(str(video))
+        while len(frames) < count:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames.append(frame)
+        cap.release()
+    elif image is not None:
+        img = cv2.imread(str(image))
+        if img is None:
+            raise SystemExit(f"Cannot read {image}")
+        h, w = img.shape[:2]
+        for i in range(count):
+            t = i / max(1, count - 1)
+            scale = 1 + 0.15 * np.sin(t * np.pi)
+            dx, dy = 40 * np.sin(t * 2 * np.pi), 20 * np.cos(t * 2 * np.pi)
+            m = np.float32(
+                [
+                    [scale, 0, dx + (1 - scale) * w / 2],
+                    [0, scale, dy + (1 - scale) * h / 2],
+                ]
+            )
+            frames.append(cv2.warpAffine(img, m, (w, h), borderMode=cv2.BORDER_REFLECT))
+    else:
+        raise SystemExit("Pass --video or --image")
+
+    if width:
+        frames = [
+            cv2.resize(
+                f,
+                (width, round(f.shape[0] * width / f.shape[1])),
+                interpolation=cv2.INTER_AREA,
+            )
+            for f in frames
+        ]
+    return frames
+
+
+def run(detector, frames, every: int, min_confidence: float):
+    tracker = BoxTracker()
+    boxes = {}
+    since = 0
+    detections = 0
+    start = time.perf_counter()
+    tracked_boxes = []
+    for i, frame in enumerate(frames):
+        gray = tracker.prepare(frame)
+        since += 1
+        if since < every and boxes:
+            tracks = tracker.track(gray)
+            if all(tracks.get(k, (None, 0.0))[1] >= min_confidence for k in boxes):
+                boxes = {k: b for k, (b, _) in tracks.items()}
+                tracked_boxes.append((i, list(boxes.values())))
+                continue
+
+        found, _ = detector.detect(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        detections += 1
+        since = 0
+        boxes = {str(j): b for j, b in enumerate(found)}
+        tracker.reset(gray, boxes)
+    elapsed = time.perf_counter() - start
+    return len(frames) / elapsed, detections, tracked_boxes
+
+
+def drift(detector, frames, tracked_boxes) -> float:
+    ious = []
+    for i, boxes in tracked_boxes:
+        truth, _ = detector.detect(cv2.cvtColor(frames[i], cv2.COLOR_BGR2RGB))
+        for b in boxes:
+            ious.append(max((t.match_percentage(b) for t in truth), default=0.0))
+    return float(np.mean(ious)) if ious else float("nan")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Detect-every-n + optical flow tracking")
+    ap.add_argument("--video", type=Path)
+    ap.add_argument("--image", type=Path)
+    ap.add_argument("--frames", type=int, default=120)
+    ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--detector", default="mediapipe")
+    ap.add_argument("--every", default="1,3,5,10")
+    ap.add_argument("--min-confidence", type=float, default=0.5)
+    args = ap.parse_args()
+
+    frames = load_frames(args.video, args.image, args.frames, args.width)
+    if not frames:
+        raise SystemExit("No frames")
+    detector = create_face_detector(args.detector, max_num_faces=3)
+    detector.detect(cv2.cvtColor(frames[0], cv2.COLOR_BGR2RGB))  # warm up
+    print(
+        f"{len(frames)} frames, {frames[0].shape[1]}x{frames[0].shape[0]}, {args.detector}"
+    )
+
+    for every in [int(n) for n in args.every.split(",")]:
+        fps, detections, tracked = run(
+            detector, frames, max(1, every), args.min_confidence
+        )
+        iou = drift(detector, frames, tracked)
+        print(
+            f"every {every:>3}  {fps:7.1f} fps  detections {detections:>4}  "
+            f"tracked {len(tracked):>4}  mean IoU vs detector {iou:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
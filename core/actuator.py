@@ -0,0 +1,160 @@
+from collections import OrderedDict
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Command:
+    def __init__(
+        self,
+        key: Hashable,
+        path: str,
+        params: Optional[dict] = None,
+        deadline: float = 2,
+        on_response: Optional[Callable[[requests.Response], None]] = None,
+    ):
+        self.key = key
+        self.path = path
+        self.params = params
+        self.created = time.time()
+        self.deadline = self.created + deadline
+        self.on_response = on_response
+        self.ok: Optional[bool] = None
+        self.done = threading.Event()
+        # blocking callers of commands this one replaced
+        self.superseded: List["Command"] = []
+
+    def finish(self, ok: bool):
+        for cmd in [self] + self.superseded:
+            cmd.ok = ok
+            cmd.done.set()
+
+
+class CommandStats:
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.dropped = 0
+        self.last_latency = 0.0
+        self.avg_latency = 0.0
+
+    def record(self, ok: bool, latency: float):
+        self.sent += 1
+        if not ok:
+            self.failed += 1
+        self.last_latency = latency
+        self.avg_latency = (
+            0.9 * self.avg_latency + 0.1 * latency if self.avg_latency else latency
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+            "expired": self.expired,
+            "dropped": self.dropped,
+            "last_latency_ms": round(self.last_latency * 1000, 1),
+            "avg_latency_ms": round(self.avg_latency * 1000, 1),
+        }
+
+
+class ActuatorService:
+    """
+    Sends commands to one camera board from a single thread over a pooled
+    keep-alive session.
+
+    Pending commands are keyed (e.g. ``("control", "servo_angle")``) so a newer
+    command replaces a queued one with the same key: the latest servo angle or
+    flash level wins. Commands that are still queued past their deadline are
+    dropped, and the request timeout never outlives the deadline.
+    """
+
+    def __init__(self, get_ip: Callable[[], str], max_pending: int = 16):
+        self.get_ip = get_ip
+        self.max_pending = max_pending
+        self.pending: "OrderedDict[Hashable, Command]" = OrderedDict()
+        self.cond = threading.Condition()
+        self.stats: Dict[str, CommandStats] = {}
+        self.thread: Optional[threading.Thread] = None
+
+        self.session = requests.Session()
+        self.session.headers.update({"Connection": "keep-alive"})
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
+    def _stats(self, cmd: Command) -> CommandStats:
+        name = cmd.key[-1] if isinstance(cmd.key, tuple) else str(cmd.key)
+        return self.stats.setdefault(str(name), CommandStats())
+
+    def submit(self, cmd: Command, blocking: bool = False) -> Optional[bool]:
+        with self.cond:
+            old = self.pending.get(cmd.key)
+            if old is not None:
+                cmd.superseded = [old] + old.superseded
+                self._stats(cmd).coalesced += 1
+            elif len(self.pending) >= self.max_pending:
+                self._stats(cmd).dropped += 1
+                print(f"Actuator queue full, dropping {cmd.key}")
+                cmd.finish(False)
+                return False
+            self.pending[cmd.key] = cmd
+            self._ensure_thread()
+            self.cond.notify()
+
+        if blocking:
+            cmd.done.wait(max(0, cmd.deadline - time.time()))
+            return bool(cmd.ok)
+        return None
+
+    def _ensure_thread(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                _, cmd = self.pending.popitem(last=False)
+            self._execute(cmd)
+
+    def _execute(self, cmd: Command):
+        stats = self._stats(cmd)
+        remaining = cmd.deadline - time.time()
+        if remaining <= 0:
+            stats.expired += 1
+            cmd.finish(False)
+            return
+
+        start = time.time()
+        ok = False
+        try:
+            response = self.session.get(
+                f"http://{self.get_ip()}{cmd.path}",
+                params=cmd.params,
+                timeout=remaining,
+            )
+            ok = response.ok
+            if ok and cmd.on_response is not None:
+                cmd.on_response(response)
+        except requests.RequestException as e:
+            print(f"Error sending {cmd.key}: {e}")
+        except Exception as e:
+            print(f"Error handling {cmd.key} response: {e}")
+            ok = False
+        finally:
+            stats.record(ok, time.time() - start)
+            cmd.finish(ok)
+
+    def to_dict(self) -> dict:
+        with self.cond:
+            pending = len(self.pending)
+        return {
+            "pending": pending,
+            "commands": {k: v.to_dict() for k, v in self.stats.items()},
+        }
@@ -0,0 +1,159 @@
+from typing import TYPE_CHECKING, Optional, Tuple
+import numpy as np
+
+if TYPE_CHECKING:
+    from core.gallery import Gallery, GallerySnapshot
+
+# rows per block when assigning vectors to centroids, bounds the distance
+# matrix to block x nlist floats
+ASSIGN_BLOCK = 8192
+
+
+def nearest_centroid(
+    x: np.ndarray, centroids: np.ndarray, sq_norms: np.ndarray
+) -> np.ndarray:
+    out = np.empty(len(x), dtype=np.int32)
+    for start in range(0, len(x), ASSIGN_BLOCK):
+        block = x[start : start + ASSIGN_BLOCK]
+        # |x|^2 is the same for every centroid, so it is left out
+        d2 = sq_norms - 2 * (block @ centroids.T)
+        out[start : start + len(block)] = np.argmin(d2, axis=1)
+    return out
+
+
+def kmeans(
+    x: np.ndarray, k: int, iterations: int, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Lloyd's k-means started from k random rows; clusters that empty out
+    are reseeded with random rows.
+    """
+    centroids = x[rng.choice(len(x), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assign = nearest_centroid(x, centroids, (centroids**2).sum(axis=1))
+        counts = np.bincount(assign, minlength=k)
+        order = np.argsort(assign, kind="stable")
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts[filled])[:-1]])
+        centroids[filled] = (
+            np.add.reduceat(x[order], starts, axis=0) / counts[filled, None]
+        )
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = x[rng.choice(len(x), len(empty), replace=False)]
+    return centroids
+
+
+class IVFState:
+    """
+    Immutable inverted lists over the first ``indexed`` rows of a gallery
+    matrix: the rows of list i are ``order[offsets[i]:offsets[i + 1]]``.
+    Published with every gallery snapshot, so searches take no lock.
+    """
+
+    __slots__ = ("centroids", "centroid_sq_norms", "order", "offsets", "indexed")
+
+    def __init__(self, centroids, order, offsets, indexed):
+        self.centroids: np.ndarray = centroids
+        self.centroid_sq_norms: np.ndarray = (centroids**2).sum(axis=1)
+        self.order: np.ndarray = order
+        self.offsets: np.ndarray = offsets
+        self.indexed: int = indexed
+
+
+class IVFIndex:
+    """
+    Inverted file index with k-means coarse quantization for a Gallery.
+
+    A search scores the query against the centroids, takes the rows of the
+    ``nprobe`` closest lists plus every row appended since the lists were
+    built, and ranks those candidates by exact distance. Writers call
+    ``maintain`` after each change: rows appended since the last build are
+    assigned to the existing centroids once they pass ``reassign_share``
+    of the gallery, and k-means is retrained when the gallery has grown by
+    ``retrain_growth`` since training or was compacted (rows renumbered).
+    Below ``min_size`` rows there is no index and matching is exact.
+    """
+
+    def __init__(
+        self,
+        min_size: int = 2048,
+        nprobe: int = 16,
+        nlist: Optional[int] = None,
+        iterations: int = 10,
+        points_per_list: int = 64,
+        retrain_growth: float = 2.0,
+        reassign_share: float = 0.05,
+        seed: int = 0,
+    ):
+        self.min_size = min_size
+        self.nprobe = nprobe
+        self.nlist = nlist
+        self.iterations = iterations
+        self.points_per_list = points_per_list
+        self.retrain_growth = retrain_growth
+        self.reassign_share = reassign_share
+        self.rng = np.random.default_rng(seed)
+
+        self.state: Optional[IVFState] = None
+        self.trained_rows = 0
+        self.trained_compactions = -1
+
+    def maintain(self, gallery: "Gallery"):
+        n = gallery.count
+        if n == 0 or n < self.min_size:
+            self.state = None
+            return
+        if (
+            self.state is None
+            or gallery.compactions != self.trained_compactions
+            or n >= self.trained_rows * self.retrain_growth
+        ):
+            self.train(gallery)
+        elif n - self.state.indexed > self.reassign_share * n:
+            self.state = self.build(gallery, self.state.centroids)
+
+    def train(self, gallery: "Gallery"):
+        n = gallery.count
+        nlist = self.nlist or max(1, int(4 * np.sqrt(n)))
+        sample = min(n, nlist * self.points_per_list)
+        rows = self.rng.choice(n, sample, replace=False) if sample < n else slice(n)
+        centroids = kmeans(
+            gallery.matrix[rows], min(nlist, sample), self.iterations, self.rng
+        )
+        self.state = self.build(gallery, centroids)
+        self.trained_rows = n
+        self.trained_compactions = gallery.compactions
+
+    def build(self, gallery: "Gallery", centroids: np.ndarray) -> IVFState:
+        # tombstoned rows stay listed, searches filter them per snapshot
+        n = gallery.count
+        assign = nearest_centroid(
+            gallery.matrix[:n], centroids, (centroids**2).sum(axis=1)
+        )
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=len(centroids)), out=offsets[1:])
+        return IVFState(centroids, order, offsets, n)
+
+    @staticmethod
+    def search(
+        state: IVFState, snapshot: "GallerySnapshot", encoding: np.ndarray, nprobe: int
+    ) -> Optional[Tuple[int, float]]:
+        # (row, distance) of the closest live candidate
+        q = np.asarray(encoding, dtype=np.float32)
+        d2c = state.centroid_sq_norms - 2 * (state.centroids @ q)
+        nprobe = min(nprobe, len(d2c))
+        probe = np.argpartition(d2c, nprobe - 1)[:nprobe]
+        parts = [state.order[state.offsets[i] : state.offsets[i + 1]] for i in probe]
+        # rows appended after the lists were built are always scanned
+        parts.append(np.arange(min(state.indexed, snapshot.count), snapshot.count))
+        candidates = np.concatenate(parts)
+        candidates = candidates[snapshot.removed_at[candidates] > snapshot.version]
+        if len(candidates) == 0:
+            return None
+
+        d2 = snapshot.sq_norms[candidates] - 2 * (snapshot.matrix[candidates] @ q)
+        d2 += float(q @ q)
+        i = int(np.argmin(d2))
+        return int(candidates[i]), float(np.sqrt(max(d2[i], 0.0)))
@@ -4,9 +4,11 @@ from typing import Optional
 import requests
 from enum import Enum
 import time
-import socket
+from core.actuator import ActuatorService, Command
+from core.discovery import find_esp32, remember_ip
+from core.status_poller import StatusPoller
 from models.config import settings
-from models.status import ESP32CameraStatus
+from models.status import ESP32CameraStatusData
 
 
 class ScreenResolution(Enum):
@@ -52,34 +54,17 @@ def verify_esp32_connection(ip):
 
 
 def find_esp32_ip() -> Optional[str]:
-    device_ip = socket.gethostbyname(socket.gethostname())
-    ip_parts = device_ip.split(".")
-    ip_parts[-1] = "1"
-    gateway_ip = ".".join(ip_parts)
-
-    def check_ip(ip, result):
-        if verify_esp32_connection(ip):
-            result.append(ip)
-
-    threads = []
-    result = []
-
-    for i in range(1, 255):
-        ip = f"{gateway_ip[:-1]}{i}"
-        thread = threading.Thread(target=check_ip, args=(ip, result))
-        thread.start()
-        threads.append(thread)
-
-    for thread in threads:
-        thread.join()
-
-    return result[0] if result else None
+    return find_esp32(
+        concurrency=settings.discovery_concurrency,
+        timeout=settings.discovery_timeout,
+    )
 
 
 def find_and_change_esp32_ip():
     # first check current ip
     if verify_esp32_connection(settings.esp32_ip):
         print(f"[1] Found esp32 camera at {settings.esp32_ip}")
+        remember_ip(settings.esp32_ip)
         return settings.esp32_ip
 
     ip = find_esp32_ip()
@@ -92,53 +77,87 @@ def find_and_change_esp32_ip():
     return None
 
 
-def buzzer(state, duration: float = 1):
+is_discovering = Value("b", False)
+
+
+def _discover():
     try:
-        requests.get(
-            f"http://{settings.esp32_ip}/buzzer?state={1 if state else 0}&duration={duration}",
-            timeout=1,
-        )
-    except requests.RequestException as e:
-        print(f"Error controlling buzzer: {e}")
+        find_and_change_esp32_ip()
+    finally:
+        is_discovering.value = False
+
+
+def discover_in_background() -> bool:
+    """
+    Start an esp32 search unless one is already running. Returns False while
+    a previous search is still in progress.
+    """
+    if is_discovering.value:
+        return False
+    is_discovering.value = True
+    threading.Thread(target=_discover, daemon=True).start()
+    return True
+
+
+actuators: dict[Optional[str], ActuatorService] = {}
+actuators_lock = threading.Lock()
+
+
+def get_actuator(ip: Optional[str] = None) -> ActuatorService:
+    # ip=None follows settings.esp32_ip, so discovery can move it
+    with actuators_lock:
+        actuator = actuators.get(ip)
+        if actuator is None:
+            actuator = ActuatorService(lambda: ip or settings.esp32_ip)
+            actuators[ip] = actuator
+        return actuator
+
+
+def buzzer(state, duration: float = 1, blocking: bool = True, ip: Optional[str] = None):
+    return get_actuator(ip).submit(
+        Command(
+            "buzzer",
+            "/buzzer",
+            {"state": 1 if state else 0, "duration": duration},
+            deadline=1,
+        ),
+        blocking=blocking,
+    )
 
 
 def control_buzzer(state, duration: float = 1):
-    threading.Thread(target=buzzer, args=(state, duration), daemon=True).start()
+    buzzer(state, duration, blocking=False)
 
 
-def set_control(var, val, blocking: bool = False):
-    def _set_control(var, val):
-        try:
-            response = requests.get(
-                f"http://{settings.esp32_ip}/control?var={var}&val={val}", timeout=5
-            )
-            return response.ok
-        except requests.RequestException as e:
-            print(f"Error controlling flash: {e}")
-            time.sleep(0.1)
+def set_control(var, val, blocking: bool = False, ip: Optional[str] = None):
+    return get_actuator(ip).submit(
+        Command(("control", var), "/control", {"var": var, "val": val}, deadline=5),
+        blocking=blocking,
+    )
 
-    if blocking:
-        return _set_control(var, val)
-    else:
-        threading.Thread(target=_set_control, args=(var, val), daemon=True).start()
 
+status_pollers: dict[Optional[str], StatusPoller] = {}
 
-check_frunning = Value("b", False)
 
+def get_status_poller(ip: Optional[str] = None) -> StatusPoller:
+    # ip=None follows settings.esp32_ip, like get_actuator
+    with actuators_lock:
+        poller = status_pollers.get(ip)
+        if poller is None:
+            poller = StatusPoller(
+                lambda: ip or settings.esp32_ip,
+                lambda: settings.status_poll_interval,
+            )
+            status_pollers[ip] = poller
+        poller.start()
+        return poller
 
-def check_and_set_framesize():
-    if check_frunning.value:
-        return
 
-    try:
-        status = ESP32CameraStatus(settings)
-        if status.data.framesize != ScreenResolution.SXGA_1280_1024.value:
-            set_framesize(ScreenResolution.SXGA_1280_1024)
-            print("Framesize changed to SXGA_1280_1024")
-    except Exception as e:
-        print(f"Error checking framesize: {e}")
-    finally:
-        check_frunning.value = False
+def check_and_set_framesize(status: ESP32CameraStatusData, ip: Optional[str] = None):
+    # Runs on every poller refresh, so drift is fixed from the cached snapshot
+    if status.framesize != ScreenResolution.SXGA_1280_1024.value:
+        set_framesize(ScreenResolution.SXGA_1280_1024, ip=ip)
+        print("Framesize changed to SXGA_1280_1024")
 
 
 def set_flash(intensity, **kw):
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import socket
+import time
+from typing import Iterable, List, Optional
+from utils.constants import esp32_ips_path
+
+# A subset of the keys the firmware's /status handler always sends, enough to
+# tell the camera apart from routers and other devices answering on port 80
+STATUS_FINGERPRINT = {
+    "xclk",
+    "pixformat",
+    "framesize",
+    "quality",
+    "led_intensity",
+    "servo_angle",
+}
+MAX_RESPONSE = 16 * 1024
+KNOWN_IPS_LIMIT = 5
+
+
+def load_known_ips() -> List[str]:
+    try:
+        with open(esp32_ips_path, "r") as f:
+            ips = json.load(f)
+        return [ip for ip in ips if isinstance(ip, str)]
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+
+def remember_ip(ip: str):
+    ips = [ip] + [i for i in load_known_ips() if i != ip]
+    try:
+        with open(esp32_ips_path, "w") as f:
+            json.dump(ips[:KNOWN_IPS_LIMIT], f)
+    except OSError as e:
+        print(f"Could not save known esp32 ips: {e}")
+
+
+def local_ip() -> str:
+    # Connecting a UDP socket sends nothing but picks the outbound interface
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("10.255.255.255", 1))
+            return s.getsockname()[0]
+    except OSError:
+        return socket.gethostbyname(socket.gethostname())
+
+
+def subnet_ips(ip: str) -> List[str]:
+    prefix = ip.rsplit(".", 1)[0]
+    return [f"{prefix}.{i}" for i in range(1, 255)]
+
+
+def is_esp32_status(body: bytes) -> bool:
+    try:
+        data = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        return False
+    return isinstance(data, dict) and STATUS_FINGERPRINT <= data.keys()
+
+
+def content_length(head: bytes) -> Optional[int]:
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            try:
+                return int(value.strip())
+            except ValueError:
+                return None
+    return None
+
+
+async def read_response(reader: asyncio.StreamReader, timeout: float) -> bytes:
+    """
+    Read one HTTP response: the headers, then Content-Length bytes of body,
+    or without a length until the body parses as a /status or the peer
+    closes. The firmware's server keeps sessions alive, so EOF may never
+    come; on a timeout whatever arrived is returned.
+    """
+    response = b""
+    try:
+        while len(response) < MAX_RESPONSE:
+            head, sep, body = response.partition(b"\r\n\r\n")
+            if sep:
+                length = content_length(head)
+                if length is not None and len(body) >= length:
+                    break
+                if length is None and is_esp32_status(body):
+                    break
+            chunk = await asyncio.wait_for(reader.read(MAX_RESPONSE), timeout)
+            if not chunk:
+                break
+            response += chunk
+    except asyncio.TimeoutError:
+        pass
+    return response
+
+
+async def probe(ip: str, port: int = 80, timeout: float = 1) -> bool:
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(ip, port), timeout
+        )
+        writer.write(
+            f"GET /status HTTP/1.0\r\nHost: {ip}\r\nConnection: close\r\n\r\n".encode()
+        )
+        await writer.drain()
+        response = await read_response(reader, timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    finally:
+        if writer is not None:
+            writer.close()
+
+    head, _, body = response.partition(b"\r\n\r\n")
+    status_line = head.split(b"\r\n", 1)[0].split()
+    if len(status_line) < 2 or status_line[1] != b"200":
+        return False
+    length = content_length(head)
+    if length is not None:
+        body = body[:length]
+    return is_esp32_status(body)
+
+
+async def scan(
+    ips: Iterable[str], port: int = 80, concurrency: int = 32, timeout: float = 1
+) -> Optional[str]:
+    """
+    Probe ``ips`` with at most ``concurrency`` connections in flight and return
+    the first one answering with an ESP32 camera /status, cancelling the rest.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def check(ip: str) -> Optional[str]:
+        async with semaphore:
+            return ip if await probe(ip, port, timeout) else None
+
+    tasks = [asyncio.create_task(check(ip)) for ip in dict.fromkeys(ips)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            ip = await next_done
+            if ip is not None:
+                return ip
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return None
+
+
+async def discover(
+    port: int = 80,
+    concurrency: int = 32,
+    timeout: float = 1,
+    ips: Optional[List[str]] = None,
+) -> Optional[str]:
+    # Last known good addresses first, then the whole /24
+    ip = None
+    known = load_known_ips()
+    if known:
+        ip = await scan(known, port, concurrency, timeout)
+
+    if ip is None:
+        ip = await scan(ips or subnet_ips(local_ip()), port, concurrency, timeout)
+    if ip:
+        remember_ip(ip)
+    return ip
+
+
+def find_esp32(
+    port: int = 80,
+    concurrency: int = 32,
+    timeout: float = 1,
+    ips: Optional[List[str]] = None,
+) -> Optional[str]:
+    start = time.time()
+    ip = asyncio.run(discover(port, concurrency, timeout, ips))
+    print(f"ESP32 scan finished in {time.time() - start:.2f}s: {ip or 'not found'}")
+    return ip
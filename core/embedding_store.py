@@ -0,0 +1,230 @@
+import contextlib
+import json
+import os
+from pathlib import Path
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextlib.contextmanager
+def file_lock(path: Path):
+    # exclusive between processes, released when the file is closed
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def file_identity(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+class EmbeddingStore:
+    """
+    Append-only embeddings of every face, keyed by face id, shared by the
+    camera and server processes.
+
+    ``<name>.f32`` holds float32 rows back to back and is memory-mapped
+    read-only, so loading the whole gallery is one mapping instead of a file
+    per face. ``<name>.index`` is a JSON-lines log of ``{"id", "row"}``
+    entries; a later entry for the same id replaces the earlier one and row
+    -1 is a tombstone. Appends write the row before its index line under a
+    file lock, so an index entry a reader sees always points at a complete
+    row. Dead rows are only reclaimed by ``compact``, which must run while
+    no other process has the store open.
+    """
+
+    def __init__(self, folder: Path, name: str = "embeddings", dim: int = 128):
+        self.data_path = folder / f"{name}.f32"
+        self.index_path = folder / f"{name}.index"
+        self.lock_path = folder / f"{name}.lock"
+        self.dim = dim
+        self.row_bytes = dim * np.dtype(np.float32).itemsize
+        self.lock = threading.RLock()
+        self.rows: Dict[str, int] = {}
+        # removed or superseded rows still taking space in the data file
+        self.dead = 0
+        self.matrix: np.ndarray = np.empty((0, dim), dtype=np.float32)
+        self.data_identity = None
+        self.index_identity = None
+        self.index_offset = 0
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, face_id: str) -> bool:
+        return face_id in self.rows
+
+    def _apply(self, face_id: str, row: int):
+        if self.rows.pop(face_id, None) is not None:
+            self.dead += 1
+        if row >= 0:
+            self.rows[face_id] = row
+
+    def _map(self):
+        identity = file_identity(self.data_path)
+        rows = self.data_path.stat().st_size // self.row_bytes if identity else 0
+        if identity == self.data_identity and rows == len(self.matrix):
+            return
+        self.data_identity = identity
+        if rows == 0:
+            self.matrix = np.empty((0, self.dim), dtype=np.float32)
+        else:
+            self.matrix = np.memmap(
+                self.data_path, dtype=np.float32, mode="r", shape=(rows, self.dim)
+            )
+
+    def refresh(self):
+        # pick up entries appended by other processes since the last call
+        with self.lock:
+            identity = file_identity(self.index_path)
+            if identity is None:
+                return
+            size = self.index_path.stat().st_size
+            if identity != self.index_identity or size < self.index_offset:
+                # first load, or the store was compacted
+                self.rows = {}
+                self.dead = 0
+                self.index_offset = 0
+                self.index_identity = identity
+            if size > self.index_offset:
+                with open(self.index_path, "rb") as f:
+                    f.seek(self.index_offset)
+                    chunk = f.read(size - self.index_offset)
+                # a line without its newline is still being written
+                end = chunk.rfind(b"\n") + 1
+                for line in chunk[:end].splitlines():
+                    try:
+                        entry = json.loads(line)
+                        self._apply(entry["id"], entry["row"])
+                    except (ValueError, KeyError, TypeError):
+                        print(f"Skipping bad line in {self.index_path}: {line!r}")
+                self.index_offset += end
+            self._map()
+
+    def _trim_index(self):
+        # drop a torn line left by a crashed writer; call under the file lock
+        if not self.index_path.exists():
+            return
+        with open(self.index_path, "r+b") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(max(0, size - 1))
+            if f.read(1) == b"\n":
+                return
+            end = size
+            while end > 0:
+                start = max(0, end - 4096)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b"\n")
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            print(f"Dropping torn line at the end of {self.index_path}")
+            f.truncate(end)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_index(
+        self, entries: Iterable[Tuple[str, int]], path: Optional[Path] = None
+    ):
+        lines = "".join(
+            json.dumps({"id": face_id, "row": row}) + "\n" for face_id, row in entries
+        )
+        with open(path or self.index_path, "ab") as f:
+            f.write(lines.encode())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append(self, face_id: str, embedding: np.ndarray) -> int:
+        vec = np.asarray(embedding, dtype=np.float32).reshape(self.dim)
+        with self.lock, file_lock(self.lock_path):
+            self.data_path.touch()
+            with open(self.data_path, "r+b") as f:
+                # a torn row from a crashed writer is overwritten
+                row = f.seek(0, os.SEEK_END) // self.row_bytes
+                f.seek(row * self.row_bytes)
+                f.write(vec.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self._trim_index()
+            self._write_index([(face_id, row)])
+            self.refresh()
+        return row
+
+    def remove(self, face_id: str) -> bool:
+        with self.lock, file_lock(self.lock_path):
+            self.refresh()
+            if face_id not in self.rows:
+                return False
+            self._trim_index()
+            self._write_index([(face_id, -1)])
+            self.refresh()
+        return True
+
+    def get(self, face_id: str) -> Optional[np.ndarray]:
+        if face_id not in self.rows:
+            self.refresh()
+        with self.lock:
+            row = self.rows.get(face_id)
+            return None if row is None else np.array(self.matrix[row])
+
+    def live(self) -> Tuple[List[str], np.ndarray]:
+        # ids and a copy of their rows, gathered from the mapping in one go
+        self.refresh()
+        with self.lock:
+            ids = list(self.rows)
+            return ids, np.asarray(self.matrix[list(self.rows.values())])
+
+    def compact(self) -> Tuple[int, int]:
+        """
+        Rewrite the store with only its live rows. Returns the row counts
+        before and after.
+        """
+        with self.lock, file_lock(self.lock_path):
+            self.refresh()
+            before = len(self.matrix)
+            ids, matrix = self.live()
+
+            data_tmp = self.data_path.with_suffix(".f32.tmp")
+            index_tmp = self.index_path.with_suffix(".index.tmp")
+            with open(data_tmp, "wb") as f:
+                f.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            index_tmp.unlink(missing_ok=True)
+            self._write_index(
+                ((face_id, row) for row, face_id in enumerate(ids)), index_tmp
+            )
+
+            # Windows cannot replace a file that is still mapped
+            self.matrix = np.empty((0, self.dim), dtype=np.float32)
+            self.data_identity = None
+            os.replace(data_tmp, self.data_path)
+            os.replace(index_tmp, self.index_path)
+            self.refresh()
+        return before, len(self.matrix)
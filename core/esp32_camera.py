@@ -1,68 +1,133 @@
-import cv2
+from collections import deque
+import threading
+import time
+from typing import Optional, Tuple
 import numpy as np
 import requests
+from core.mjpeg import MJPEGParser, decode_jpeg, parse_boundary
+from utils.constants import should_run_thread
 
 session = requests.Session()
 session.headers.update({"Connection": "keep-alive"})
 
-# def get_video_feed(url):
-#     try:
-#         response = session.get(url, stream=True)
-#         if not response.ok:
-#             print(f"Bad response: {response.status_code}")
-#             return None
-
-#         bytes_array = bytearray(b"")
-#         for chunk in response.iter_content(chunk_size=8192):  # Increased chunk size
-#             bytes_array.extend(chunk)
-
-#             # Find the beginning and end of JPEG
-#             a = bytes_array.find(b"\xff\xd8")
-#             b = bytes_array.find(b"\xff\xd9")
-
-#             if a != -1 and b != -1:
-#                 jpg = bytes_array[a : b + 2]
-#                 bytes_array = bytes_array[b + 2 :]
-
-#                 try:
-#                     # Use IMREAD_REDUCED_COLOR_2 for faster decoding
-#                     frame = cv2.imdecode(
-#                         np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_REDUCED_COLOR_2
-#                     )
-#                     return frame
-#                 except Exception as e:
-#                     print(f"Error decoding frame: {e}")
-#                     continue
-
-#     except Exception as e:
-#         print(f"Error in get_video_feed: {e}")
-#     return None
-
-
-def get_video_feed(url):
-    response = session.get(url, stream=True, timeout=5)
-    if not response.ok:
-        print(f"Bad response: {response.status_code}")
-        return None
-
-    bytes_array = bytearray(b"")
-    for chunk in response.iter_content(chunk_size=1024):  # Increased chunk size
-        bytes_array.extend(chunk)
-
-        # Find the beginning and end of JPEG
-        a = bytes_array.find(b"\xff\xd8")
-        b = bytes_array.find(b"\xff\xd9")
-
-        if a != -1 and b != -1:
-            jpg = bytes_array[a : b + 2]
-            bytes_array = bytes_array[b + 2 :]
+FrameEntry = Tuple[int, float, np.ndarray]
 
+
+def _iter_chunks(response: requests.Response, chunk_size: int = 64 * 1024):
+    # read1 returns whatever has arrived instead of waiting for a full block
+    read1 = getattr(response.raw, "read1", None)
+    if read1 is None:
+        yield from response.iter_content(chunk_size=1024)
+        return
+
+    while True:
+        chunk = read1(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _iter_jpegs(response: requests.Response):
+    parser = MJPEGParser(parse_boundary(response.headers.get("Content-Type", "")))
+    for chunk in _iter_chunks(response):
+        parser.feed(chunk)
+        for jpg, _ in parser.frames():
+            yield jpg
+
+
+class ESP32StreamReader:
+    """
+    Keeps a single MJPEG stream to the camera open and decodes every frame
+    into a small ring buffer of (sequence number, timestamp, frame).
+    """
+
+    def __init__(self, url: str, buffer_size: int = 3, reconnect_delay: float = 1):
+        self.url = url
+        # width the pipeline wants, used to pick the JPEG decode scale
+        self.target_width = 0
+        self.reconnect_delay = reconnect_delay
+        self.frames: deque[FrameEntry] = deque(maxlen=buffer_size)
+        self.seq = 0
+        self.failures = 0
+        self.last_frame_time = 0.0
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def latest(self) -> Optional[FrameEntry]:
+        # deque appends/indexing are atomic, no lock needed for readers
+        try:
+            return self.frames[-1]
+        except IndexError:
+            return None
+
+    def _run(self):
+        while self.running and should_run_thread.value:
             try:
-                # Use IMREAD_REDUCED_COLOR_2 for faster decoding
-                frame = cv2.imdecode(
-                    np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_REDUCED_COLOR_2
-                )
-                return frame
+                with session.get(self.url, stream=True, timeout=5) as response:
+                    if not response.ok:
+                        raise ConnectionError(f"Bad response: {response.status_code}")
+
+                    for jpg in _iter_jpegs(response):
+                        if not self.running or not should_run_thread.value:
+                            break
+                        self._decode(jpg)
+
+                raise ConnectionError("Stream closed")
             except Exception as e:
-                print(f"Error decoding frame: {e}")
-                continue
+                self.failures += 1
+                print(f"Stream error from {self.url}: {e}")
+                time.sleep(self.reconnect_delay)
+
+    def _decode(self, jpg):
+        try:
+            frame = decode_jpeg(jpg, self.target_width)
+        except Exception as e:
+            print(f"Error decoding frame: {e}")
+            return
+
+        if frame is None:
+            return
+
+        self.seq += 1
+        self.failures = 0
+        self.last_frame_time = time.time()
+        self.frames.append((self.seq, self.last_frame_time, frame))
+
+
+readers: dict[str, ESP32StreamReader] = {}
+readers_lock = threading.Lock()
+
+
+def get_stream_reader(url: str) -> ESP32StreamReader:
+    with readers_lock:
+        reader = readers.get(url)
+        if reader is None:
+            reader = ESP32StreamReader(url)
+            readers[url] = reader
+        reader.start()
+        return reader
+
+
+def stop_stream_reader(url: str):
+    with readers_lock:
+        reader = readers.pop(url, None)
+    if reader is not None:
+        reader.stop()
+
+
+def get_video_feed(url, target_width: int = 0) -> Optional[np.ndarray]:
+    # Never blocks: returns the newest decoded frame, or None until the first arrives
+    reader = get_stream_reader(url)
+    reader.target_width = target_width
+    entry = reader.latest()
+    return entry[2] if entry is not None else None
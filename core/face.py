@@ -3,7 +3,6 @@ import pickle
 import time
 import face_recognition
 import threading
-from queue import Queue, Empty
 import numpy as np
 from core.controller import open_and_close_door
 from models.config import settings
@@ -11,16 +10,26 @@ from models.face import Face, db
 from models.helpers import Box
 from utils.constants import em_path, img_folder, should_run_thread
 import cv2
-from typing import Optional
+from typing import Dict, Optional
+from core.ann_index import IVFIndex
+from core.embedding_store import EmbeddingStore
+from core.gallery import Gallery
+from core.recognition import PRIORITY_RECHECK, RecognitionPool
 from utils.face_detection_helpers import extract_face
 from utils.helpers import is_less_than_eq, should_open_door
 
 
-known_face_encodings = []
-known_face_names = []
-
-unknown_face_encodings = []
-unknown_face_names = []
+# Embeddings by face name; readers match against lock-free snapshots
+known_faces = Gallery(
+    ann=(
+        IVFIndex(min_size=settings.ann_min_gallery, nprobe=settings.ann_nprobe)
+        if settings.ann_min_gallery > 0
+        else None
+    )
+)
+unknown_faces = Gallery()
+# Embeddings by face id, one file mapped by every process
+embedding_store = EmbeddingStore(em_path)
 
 
 def save_face(img_path: str, name: str, bbox: Optional[Box] = None):
@@ -47,192 +56,277 @@ def save_face(img_path: str, name: str, bbox: Optional[Box] = None):
     image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
     cv2.imwrite(str(image_path), image)
 
-    # Save embedding
-    epath = em_path / f"{name}.pkl"
-    with open(epath, "wb") as f:
-        pickle.dump(embedding, f)
-
     face = Face(
         name=name,
         bbox=bbox,
         face_image_path=str(image_path),
-        face_embeddings_path=str(epath),
+        face_embeddings_path=str(embedding_store.data_path),
         is_unknown=False,
     )
     face.active = False
+    # stored before the row exists, so the change feed always finds it
+    embedding_store.append(face.id, embedding)
     face.create()
 
-    known_face_encodings.append(embedding)
-    known_face_names.append(name)
+    known_faces.add(name, embedding, face.id)
 
     return face
 
 
-def load_faces():
-    while should_run_thread.value:
-        total = db.face.count()
-        if total == len(known_face_names) + len(unknown_face_names):
-            time.sleep(1)
+def load_embedding(face) -> Optional[np.ndarray]:
+    embedding = embedding_store.get(face.id)
+    if embedding is not None:
+        return embedding
+    return load_pickled_embedding(face)
+
+
+def load_pickled_embedding(face) -> Optional[np.ndarray]:
+    # pickles from before the store, see scripts/migrate_embeddings.py
+    path = face.face_embeddings_path
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError) as e:
+        print(f"Could not load embedding {path}: {e}")
+        return None
+
+
+def sync_gallery(gallery: Gallery, faces, stored: Dict[str, np.ndarray]):
+    # only embeddings of faces the gallery does not have yet are copied;
+    # ``stored`` maps face ids to rows of embedding_store.live()
+    names = {face.name for face in faces}
+    add = []
+    for face in faces:
+        if face.name in gallery:
+            continue
+        embedding = stored.get(face.id)
+        if embedding is None:
+            embedding = load_pickled_embedding(face)
+        if embedding is not None:
+            add.append((face.name, embedding, face.id))
+    gallery.update(add=add, remove=gallery.names_set() - names)
+
+
+def apply_face_changes(changes):
+    """
+    Bring the galleries up to date for the faces named in a batch of
+    FaceChange entries. The Face rows hold the current state, so several
+    changes to one face collapse into a single update, and renames or
+    known/unknown flips move the existing row without reading the pickle.
+    """
+    face_ids = list({change.faceId for change in changes})
+    faces = {f.id: f for f in db.face.find_many(where={"id": {"in": face_ids}})}
+    updates = {known_faces: ([], []), unknown_faces: ([], [])}
+
+    for face_id in face_ids:
+        face = faces.get(face_id)  # None once deleted
+        target = None
+        if face is not None:
+            target = unknown_faces if face.is_unknown else known_faces
+
+        embedding = None
+        current = False
+        for gallery, (_, remove) in updates.items():
+            name = gallery.name_of(face_id)
+            if name is None:
+                continue
+            if gallery is target and name == face.name:
+                current = True
+                continue
+            embedding = gallery.embedding(name)
+            remove.append(name)
+
+        if target is None or current:
             continue
+        if embedding is None:
+            embedding = load_embedding(face)
+        if embedding is not None:
+            updates[target][0].append((face.name, embedding, face.id))
 
-        known_face_encodings.clear()
-        known_face_names.clear()
-        faces = db.face.find_many(where={"is_unknown": False})
-        for face in faces:
-            path = face.face_embeddings_path
-            with open(path, "rb") as f:
-                embedding = pickle.load(f)
+    for gallery, (add, remove) in updates.items():
+        if add or remove:
+            gallery.update(add=add, remove=remove)
 
-            known_face_encodings.append(embedding)
-            known_face_names.append(face.name)
 
-        unknown_face_encodings.clear()
-        unknown_face_names.clear()
-        faces = db.face.find_many(where={"is_unknown": True})
-        for face in faces:
-            path = face.face_embeddings_path
-            with open(path, "rb") as f:
-                embedding = pickle.load(f)
+FACE_CHANGES_PER_POLL = 500
 
-            unknown_face_encodings.append(embedding)
-            unknown_face_names.append(face.name)
 
-        time.sleep(1)
+def load_faces():
+    # One full load, then only the FaceChange entries past the last one
+    # applied: an idle poll is a single indexed query and each change reads
+    # at most its own face row and embedding. The feed position is taken
+    # before the full load, so changes racing it are replayed (harmlessly).
+    latest = db.facechange.find_first(order={"seq": "desc"})
+    seq = latest.seq if latest else 0
+    # every stored embedding gathered from the mapping in one go
+    ids, matrix = embedding_store.live()
+    stored = dict(zip(ids, matrix))
+    sync_gallery(known_faces, db.face.find_many(where={"is_unknown": False}), stored)
+    sync_gallery(unknown_faces, db.face.find_many(where={"is_unknown": True}), stored)
+
+    while should_run_thread.value:
+        changes = db.facechange.find_many(
+            where={"seq": {"gt": seq}},
+            order={"seq": "asc"},
+            take=FACE_CHANGES_PER_POLL,
+        )
+        if changes:
+            apply_face_changes(changes)
+            seq = changes[-1].seq
+        if len(changes) < FACE_CHANGES_PER_POLL:
+            time.sleep(1)
 
 
-lock = threading.Lock()
-# Replace the Queue() initialization with a size limit
-q = Queue(maxsize=5)  # Increased queue size slightly
-recognition_timeout = 2.0  # seconds
 last_open_door = Value("d", 0)
 
 
-def _start_recognizing(*, frame: np.ndarray, face: Face, tolerance: float):
-    if len(known_face_encodings) == 0:
-        print("No known faces to compare with")
+def check_door(face: Face):
+    # Called on recognition and whenever a known face's liveness is updated
+    if not should_open_door(
+        face, settings.liveness_threshold, settings.liveness_min_samples
+    ):
         return
 
-    try:
-        # Add timeout for face encoding
-        start_time = time.time()
-        face_encodings = face_recognition.face_encodings(
-            frame, [(face.bbox.top, face.bbox.right, face.bbox.bottom, face.bbox.left)]
-        )
-
-        if time.time() - start_time > recognition_timeout:
-            print("Face recognition timeout")
-            return
-
-        if not face_encodings:
+    with last_open_door.get_lock():
+        if time.time() - last_open_door.value <= settings.door_open_delay:
             return
+        last_open_door.value = time.time()
+
+    print("Opening door...")
+    threading.Thread(target=open_and_close_door, daemon=True).start()
+
+
+def match_face(face: Face, face_encoding: np.ndarray, tolerance: float):
+    # # First check if we have any known faces to compare with
+    # if len(known_faces) == 0:
+    #     print("No known faces to compare with")
+    #     # Just create a new unknown face
+    #     epath = str(em_path / str(face.name + ".pkl"))
+    #     with open(epath, "wb") as f:
+    #         pickle.dump(face_encoding, f)
+
+    #     face.face_embeddings_path = epath
+    #     face.is_unknown = True
+    #     face.create()
+
+    #     unknown_faces.add(face.name, face_encoding, face.id)
+    #     return
+
+    # Best match (smallest distance) from a lock-free gallery snapshot
+    snapshot = known_faces.snapshot()
+    match = snapshot.best_match(face_encoding)
+    cache = face.state.get("recognition")
+    if cache is not None:
+        cache.result(
+            face_encoding, match[1] if match else float("inf"), snapshot.version
+        )
 
-        # Process known faces
-        face_encoding = face_encodings[0]
-        matches = []
+    if match is not None:
+        # Debug information about match
+        print(f"Best match distance: {match[1]:.3f} <= {tolerance}")
+
+    if match is None or not is_less_than_eq(match[1], tolerance):
+        if not face.is_unknown:
+            # re-verification failed; one blurred or side-on crop is not
+            # enough, the track keeps its name until the failures repeat or
+            # a crop as good as the matching one fails
+            if cache is not None and not cache.verify_failed(
+                settings.recognition_demote_after
+            ):
+                print(f"Track of {face.name} failed re-verification, keeping it")
+                return
+            print(f"Track of {face.name} no longer matches, marking it unknown")
+            face.name = f"Unknown_{face.id.split('-')[0]}"
+            face.is_unknown = True
+            if cache is not None:
+                cache.attempts = 0
+        # # No good match found, create a new unknown face
+        # print(f"No good match found (best distance: {best_match_distance:.3f})")
+
+        # if face.liveness < 0.5:
+        #     print("Low liveness score, skipping face registration")
+        #     return
 
-        # # First check if we have any known faces to compare with
-        # if len(known_face_encodings) == 0:
-        #     print("No known faces to compare with")
-        #     # Just create a new unknown face
-        #     epath = str(em_path / str(face.name + ".pkl"))
-        #     with open(epath, "wb") as f:
-        #         pickle.dump(face_encoding, f)
+        # epath = str(em_path / str(face.name + ".pkl"))
+        # with open(epath, "wb") as f:
+        #     pickle.dump(face_encoding, f)
 
-        #     face.face_embeddings_path = epath
-        #     face.is_unknown = True
-        #     face.create()
+        # face.face_embeddings_path = epath
+        # face.is_unknown = True
+        # face.create()
 
-        #     unknown_face_encodings.append(face_encoding)
-        #     unknown_face_names.append(face.name)
-        #     return
+        # unknown_faces.add(face.name, face_encoding, face.id)
+        return
+    name, best_match_distance = match
 
-        with lock:  # Use lock only for the comparison
-            # Instead of just comparing faces, calculate the face distances
-            face_distances = face_recognition.face_distance(
-                known_face_encodings, face_encoding
-            )
-            # Get the best match (smallest distance)
-            best_match_index = np.argmin(face_distances)
-            best_match_distance = face_distances[best_match_index]
-
-            # Debug information about match
-            print(f"Best match distance: {best_match_distance:.3f} <= {tolerance}")
-
-            if is_less_than_eq(best_match_distance, tolerance):
-                name = known_face_names[best_match_index]
-                print(
-                    f"Recognized face: {name} with confidence: {1-best_match_distance:.2f}"
-                )
-                f = db.face.find_unique(where={"name": name})
-                if f:
-                    face.update_from_db(f)
-                    face.is_unknown = False
-
-                    if (
-                        should_open_door(face, settings.liveness_threshold)
-                        and time.time() - last_open_door.value
-                        > settings.door_open_delay
-                    ):
-                        print("Opening door...")
-                        last_open_door.value = time.time()
-                        threading.Thread(
-                            target=open_and_close_door, daemon=True
-                        ).start()
-            # else:
-            #     # No good match found, create a new unknown face
-            #     print(f"No good match found (best distance: {best_match_distance:.3f})")
-
-            #     if face.liveness < 0.5:
-            #         print("Low liveness score, skipping face registration")
-            #         return
-
-            #     epath = str(em_path / str(face.name + ".pkl"))
-            #     with open(epath, "wb") as f:
-            #         pickle.dump(face_encoding, f)
-
-            #     face.face_embeddings_path = epath
-            #     face.is_unknown = True
-            #     face.create()
-
-            #     unknown_face_encodings.append(face_encoding)
-            #     unknown_face_names.append(face.name)
+    print(f"Recognized face: {name} with confidence: {1-best_match_distance:.2f}")
+    f = db.face.find_unique(where={"name": name})
+    if f:
+        face.update_from_db(f)
+        face.is_unknown = False
+        if cache is not None:
+            cache.matched()
+        check_door(face)
+
+
+def rematch_cached(face: Face, tolerance: float) -> bool:
+    """
+    Match an unknown track's cached embedding against a gallery that changed
+    since it was encoded, so newly registered faces are picked up without
+    another encode. Returns True when the track is now known.
+    """
+    cache = face.state.get("recognition")
+    if cache is None or cache.embedding is None:
+        return False
+    if cache.gallery_version == known_faces.snapshot().version:
+        return False
+    match_face(face, cache.embedding, tolerance)
+    return not face.is_unknown
+
+
+def _recognized(context, face_encoding: Optional[np.ndarray]):
+    # RecognitionPool callback; the encoding is None when it failed or the
+    # job was dropped, the face is then retried as unknown
+    face, tolerance = context
+    try:
+        if face_encoding is None:
+            return
 
+        match_face(face, face_encoding, tolerance)
     except Exception as e:
         print(f"Recognition error: {e}")
     finally:
         face.is_loaded = True
 
 
-is_recognizing = Value("b", False)
+# Encoding runs in worker processes, see core/recognition.py
+recognition_pool = RecognitionPool(_recognized, settings.recognition_queue_size)
 
 
 def recognize_faces():
-    if is_recognizing.value:
-        return
-
-    while not q.empty():
-        is_recognizing.value = True
-        try:
-            kw = q.get(timeout=0.5)
-            _start_recognizing(**kw)
-            q.task_done()
-        except Empty:
-            # Queue is empty, just continue waiting
-            time.sleep(0.1)
-            continue
-
-    is_recognizing.value = False
-
-
-def start_recognizing(*, frame: np.ndarray, face: Face, tolerance: float = 0.5):
-    # Changed default tolerance from 0.7 to 0.5 (stricter matching)
-    print("Queueing recognition")
-    try:
-        # Use put_nowait to prevent blocking
-        if not q.full():
-            q.put_nowait({"frame": frame, "face": face, "tolerance": tolerance})
-            threading.Thread(target=recognize_faces).start()
-        else:
-            print("Recognition queue full, skipping face...")
-    except Exception as e:
-        print(f"Error queueing recognition: {e}")
+    # runs the recognition workers until should_run_thread is cleared
+    recognition_pool.run(settings.recognition_workers)
+
+
+def start_recognizing(
+    *,
+    frame: np.ndarray,
+    face: Face,
+    tolerance: float = 0.5,
+    landmarks: Optional[np.ndarray] = None,
+    box: Optional[Box] = None,
+    priority: int = PRIORITY_RECHECK,
+) -> bool:
+    # box/landmarks locate the face in ``frame``; box defaults to face.bbox
+    if len(known_faces) == 0:
+        face.is_loaded = True
+        return False
+
+    return recognition_pool.submit(
+        face.id,
+        frame,
+        box or face.bbox,
+        landmarks,
+        priority=priority,
+        context=(face, tolerance),
+    )
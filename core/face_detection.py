@@ -1,48 +1,253 @@
-from typing import List, Tuple
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Type
+import urllib.request
+import cv2
 import mediapipe as mp
 import numpy as np
-from utils.face_detection_helpers import extract_face
+from utils.constants import yunet_checkpoint_path
+from utils.face_detection_helpers import extract_face, landmarks_to_array
 from models.helpers import Box
 
+YUNET_URL = "https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/face_detection_yunet_2023mar.onnx"
+
+# FaceMesh indices for the eye corners, nose tip and mouth corners, image left to right
+FACEMESH_EYE_L = [33, 133]
+FACEMESH_EYE_R = [362, 263]
+FACEMESH_NOSE = 1
+FACEMESH_MOUTH = [61, 291]
+# The only points read: the alignment points above, in that order, then the
+# face outline, which with them bounds the whole mesh to within a pixel
+FACEMESH_POINTS = FACEMESH_EYE_L + FACEMESH_EYE_R + [FACEMESH_NOSE] + FACEMESH_MOUTH
+FACEMESH_POINTS += sorted(
+    {i for edge in mp.solutions.face_mesh.FACEMESH_FACE_OVAL for i in edge}  # type: ignore
+)
+
+# (boxes, landmarks) where landmarks is (N, 4, 2) float32 in pixels ordered as
+# eye on the image left, eye on the image right, nose tip, mouth center
+# (see utils.face_detection_helpers.ALIGN_TEMPLATE), or None for backends
+# that only find boxes
+Detections = Tuple[List[Box], Optional[np.ndarray]]
+
+
+def clip_box(
+    left: float, top: float, right: float, bottom: float, w: int, h: int
+) -> Box:
+    # Ensure coordinates are within image bounds
+    return Box(
+        top=max(0, int(round(top))),
+        right=min(w, int(round(right))),
+        bottom=min(h, int(round(bottom))),
+        left=max(0, int(round(left))),
+    )
+
+
+class FaceDetector(ABC):
+    """
+    Base class for face detection backends. Subclasses implement ``detect``,
+    which takes an RGB image and returns face boxes in pixel coordinates and,
+    when the backend has them, facial landmarks used for alignment.
+    """
+
+    name = ""
+    # keeps state from one frame to the next, so an instance may only ever
+    # see a single video stream
+    stateful = False
 
-class FaceDetection:
     def __init__(self, max_num_faces: int = 1):
+        self.max_num_faces = max_num_faces
+
+    @abstractmethod
+    def detect(self, image: np.ndarray) -> Detections: ...
+
+    def __call__(
+        self, image: np.ndarray, source: Optional[np.ndarray] = None
+    ) -> Tuple[List[np.ndarray], List[Box], List[Optional[np.ndarray]]]:
+        """
+        Detect on ``image``. When ``source`` (the full resolution frame
+        ``image`` was downscaled from) is given, face crops are cut from it
+        instead; boxes and landmarks stay in ``image`` coordinates.
+        """
+        boxes: list[Box] = []
+        faces = []
+        landmarks: list[Optional[np.ndarray]] = []
+        detected, points = self.detect(image)
+        source = image if source is None else source
+        scale = source.shape[1] / image.shape[1]
+        for i, box in enumerate(detected):
+            # Only process if we have a valid box size
+            if box.right > box.left and box.bottom > box.top:
+                face_arr = extract_face(
+                    source, box.scale_copy(scale) if scale != 1 else box
+                )
+                if face_arr is not None and face_arr.size > 0:
+                    boxes.append(box)
+                    faces.append(face_arr)
+                    landmarks.append(points[i] if points is not None else None)
+
+        return faces, boxes, landmarks
+
+
+class FaceMeshDetector(FaceDetector):
+    """468-point FaceMesh run on every frame independently."""
+
+    name = "facemesh"
+    static_image_mode = True
+
+    def __init__(self, max_num_faces: int = 1):
+        super().__init__(max_num_faces)
         self.detector = mp.solutions.face_mesh.FaceMesh(  # type: ignore
-            max_num_faces=max_num_faces, static_image_mode=True
+            max_num_faces=max_num_faces, static_image_mode=self.static_image_mode
         )
 
-    def __call__(self, image: np.ndarray) -> Tuple[List[np.ndarray], List[Box]]:
+    def detect(self, image: np.ndarray) -> Detections:
         h, w = image.shape[:2]
         predictions = self.detector.process(image)
-        boxes: list[Box] = []
-        faces = []
-        if predictions.multi_face_landmarks:
-            for prediction in predictions.multi_face_landmarks:
-                pts = np.array(
-                    [(pt.x * w, pt.y * h) for pt in prediction.landmark],
-                    dtype=np.float64,
-                )
-                bbox = np.vstack([pts.min(axis=0), pts.max(axis=0)])
-                bbox = np.round(bbox).astype(np.int32)
-                
-                # Ensure coordinates are within image bounds
-                bbox[0][0] = max(0, bbox[0][0])  # left
-                bbox[0][1] = max(0, bbox[0][1])  # top
-                bbox[1][0] = min(w, bbox[1][0])  # right
-                bbox[1][1] = min(h, bbox[1][1])  # bottom
-                
-                box = Box(
-                    top=bbox[0][1],
-                    right=bbox[1][0],
-                    bottom=bbox[1][1],
-                    left=bbox[0][0],
-                )
-                
-                # Only process if we have a valid box size
-                if box.right > box.left and box.bottom > box.top:
-                    face_arr = extract_face(image, box)
-                    if face_arr is not None and face_arr.size > 0:
-                        boxes.append(box)
-                        faces.append(face_arr)
-                        
-        return faces, boxes
+        if not predictions.multi_face_landmarks:
+            return [], None
+
+        boxes = []
+        landmarks = np.empty((len(predictions.multi_face_landmarks), 4, 2), np.float32)
+        for i, prediction in enumerate(predictions.multi_face_landmarks):
+            pts = landmarks_to_array(prediction, FACEMESH_POINTS) * (w, h)
+            (left, top), (right, bottom) = pts.min(axis=0), pts.max(axis=0)
+            boxes.append(clip_box(left, top, right, bottom, w, h))
+            landmarks[i, 0] = pts[0:2].mean(axis=0)
+            landmarks[i, 1] = pts[2:4].mean(axis=0)
+            landmarks[i, 2] = pts[4]
+            landmarks[i, 3] = pts[5:7].mean(axis=0)
+        return boxes, landmarks
+
+
+class FaceMeshTrackingDetector(FaceMeshDetector):
+    """
+    FaceMesh in video mode: landmarks are tracked from the previous frame and
+    the detector only reruns when tracking is lost. Keeps state between calls,
+    so it suits a single camera per instance.
+    """
+
+    name = "facemesh_tracking"
+    static_image_mode = False
+    stateful = True
+
+
+class MediaPipeFaceDetector(FaceDetector):
+    """BlazeFace short-range detector, boxes only."""
+
+    name = "mediapipe"
+
+    def __init__(self, max_num_faces: int = 1, min_confidence: float = 0.5):
+        super().__init__(max_num_faces)
+        self.detector = mp.solutions.face_detection.FaceDetection(  # type: ignore
+            model_selection=0, min_detection_confidence=min_confidence
+        )
+
+    def detect(self, image: np.ndarray) -> Detections:
+        h, w = image.shape[:2]
+        predictions = self.detector.process(image)
+        if not predictions.detections:
+            return [], None
+
+        detections = sorted(predictions.detections, key=lambda d: -d.score[0])
+        detections = detections[: self.max_num_faces]
+        boxes = []
+        landmarks = np.empty((len(detections), 4, 2), np.float32)
+        for i, detection in enumerate(detections):
+            rel = detection.location_data.relative_bounding_box
+            left, top = rel.xmin * w, rel.ymin * h
+            boxes.append(
+                clip_box(left, top, left + rel.width * w, top + rel.height * h, w, h)
+            )
+            # keypoints: right eye, left eye, nose tip, mouth center, ears
+            kps = detection.location_data.relative_keypoints
+            landmarks[i] = [(kps[k].x * w, kps[k].y * h) for k in range(4)]
+        return boxes, landmarks
+
+
+class YuNetDetector(FaceDetector):
+    """OpenCV's YuNet CNN detector from a local ONNX file."""
+
+    name = "yunet"
+
+    def __init__(
+        self,
+        max_num_faces: int = 1,
+        checkpoint_path: Path = yunet_checkpoint_path,
+        min_confidence: float = 0.7,
+    ):
+        super().__init__(max_num_faces)
+        if not Path(checkpoint_path).is_file():
+            print("Downloading the YuNet onnx checkpoint:")
+            urllib.request.urlretrieve(YUNET_URL, Path(checkpoint_path).as_posix())
+        self.detector = cv2.FaceDetectorYN.create(
+            Path(checkpoint_path).as_posix(), "", (320, 320), min_confidence
+        )
+        self.input_size = (320, 320)
+
+    def detect(self, image: np.ndarray) -> Detections:
+        h, w = image.shape[:2]
+        if self.input_size != (w, h):
+            self.detector.setInputSize((w, h))
+            self.input_size = (w, h)
+
+        # YuNet expects BGR
+        _, detections = self.detector.detect(cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+        if detections is None:
+            return [], None
+
+        detections = detections[np.argsort(-detections[:, -1])][: self.max_num_faces]
+        boxes = [
+            clip_box(x, y, x + bw, y + bh, w, h) for x, y, bw, bh in detections[:, :4]
+        ]
+        # right eye, left eye, nose tip, right and left mouth corners
+        pts = detections[:, 4:14].reshape(-1, 5, 2).astype(np.float32)
+        landmarks = np.concatenate(
+            [pts[:, :3], pts[:, 3:].mean(axis=1, keepdims=True)], axis=1
+        )
+        return boxes, landmarks
+
+
+class HaarDetector(FaceDetector):
+    """Viola-Jones cascade shipped with opencv, cheapest and least accurate."""
+
+    name = "haar"
+
+    def __init__(self, max_num_faces: int = 1):
+        super().__init__(max_num_faces)
+        self.detector = cv2.CascadeClassifier(
+            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"  # type: ignore
+        )
+
+    def detect(self, image: np.ndarray) -> Detections:
+        h, w = image.shape[:2]
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        rects = self.detector.detectMultiScale(
+            gray, scaleFactor=1.1, minNeighbors=5, minSize=(40, 40)
+        )
+        # largest faces first
+        rects = sorted(rects, key=lambda r: -r[2] * r[3])[: self.max_num_faces]
+        return [clip_box(x, y, x + rw, y + rh, w, h) for x, y, rw, rh in rects], None
+
+
+DETECTORS: Dict[str, Type[FaceDetector]] = {
+    cls.name: cls
+    for cls in (
+        FaceMeshDetector,
+        FaceMeshTrackingDetector,
+        MediaPipeFaceDetector,
+        YuNetDetector,
+        HaarDetector,
+    )
+}
+
+
+def create_face_detector(name: str, max_num_faces: int = 1) -> FaceDetector:
+    if name not in DETECTORS:
+        raise ValueError(
+            f"Unknown face detector {name}, expected one of {', '.join(DETECTORS)}"
+        )
+    return DETECTORS[name](max_num_faces=max_num_faces)
+
+
+# The original FaceMesh detector
+FaceDetection = FaceMeshDetector
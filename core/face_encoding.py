@@ -0,0 +1,27 @@
+from typing import Optional
+import face_recognition
+import numpy as np
+from models.helpers import Box
+from utils.face_detection_helpers import align_face
+
+
+def encode_face(
+    frame: np.ndarray, box: Box, landmarks: Optional[np.ndarray] = None
+) -> Optional[np.ndarray]:
+    """
+    128-d face encoding. With detector landmarks the face is aligned here and
+    the chip goes straight to the dlib encoder, skipping face_recognition's
+    own shape predictor pass.
+    """
+    if landmarks is not None:
+        chip = align_face(frame, landmarks)
+        if chip is not None:
+            descriptor = face_recognition.api.face_encoder.compute_face_descriptor(
+                np.ascontiguousarray(chip)
+            )
+            return np.array(descriptor)
+
+    encodings = face_recognition.face_encodings(
+        frame, [(box.top, box.right, box.bottom, box.left)]
+    )
+    return encodings[0] if encodings else None
@@ -1,15 +1,178 @@
+from functools import lru_cache
 from pathlib import Path
+import threading
+from typing import List, Optional, Sequence, Tuple
 import cv2
 import numpy as np
 import onnxruntime
-from PIL import Image
-from torchvision import transforms as T
 import urllib.request
 from tqdm import tqdm
+from core.onnx_runtime import OnnxModel
+
+INPUT_SIZE = 224
+# ImageNet normalization folded into one multiply-add per pixel
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+SCALE = (1 / (255 * STD)).reshape(3, 1, 1)
+OFFSET = (-MEAN / STD).reshape(3, 1, 1)
+
+
+@lru_cache(maxsize=32)
+def resize_taps(in_size: int, out_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Source indices and weights, both (taps, out_size), of PIL's antialiased
+    bilinear (triangle) filter, which torchvision's Resize uses on PIL images
+    when shrinking.
+    """
+    scale = in_size / out_size
+    support = max(scale, 1.0)
+    taps = int(np.ceil(support)) * 2 + 1
+    index = np.zeros((taps, out_size), dtype=np.intp)
+    weights = np.zeros((taps, out_size), dtype=np.float32)
+    for i in range(out_size):
+        center = (i + 0.5) * scale
+        lo = max(int(center - support + 0.5), 0)
+        hi = min(int(center + support + 0.5), in_size)
+        x = (np.arange(lo, hi) - center + 0.5) / support
+        w = np.clip(1 - np.abs(x), 0, None)
+        index[: hi - lo, i] = np.arange(lo, hi)
+        weights[: hi - lo, i] = w / w.sum()
+    # the last taps can carry zero weight for every output pixel
+    used = int(np.flatnonzero(weights.any(axis=1))[-1]) + 1
+    return index[:used], weights[:used]
+
+
+@lru_cache(maxsize=32)
+def pixel_taps(
+    in_size: int, out_size: int, channels: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    # resize_taps over the columns of an image flattened to (h, w * channels)
+    index, weights = resize_taps(in_size, out_size)
+    index = index[:, :, None] * channels + np.arange(channels)
+    return index.reshape(len(index), -1), np.repeat(weights, channels, axis=1)
+
+
+def filter_axis(
+    src: np.ndarray, index: np.ndarray, weights: np.ndarray, axis: int
+) -> np.ndarray:
+    # one gather and multiply-add over the whole 2D array per tap
+    shape = (-1, 1) if axis == 0 else (1, -1)
+    out = np.take(src, index[0], axis=axis)
+    out *= weights[0].reshape(shape)
+    for idx, wt in zip(index[1:], weights[1:]):
+        taps = np.take(src, idx, axis=axis)
+        taps *= wt.reshape(shape)
+        out += taps
+    return out
+
+
+def resize(face_arr: np.ndarray, size: int = INPUT_SIZE) -> np.ndarray:
+    h, w, c = face_arr.shape
+    if h <= size and w <= size:
+        # plain bilinear upscaling, within one grey level of PIL
+        return cv2.resize(face_arr, (size, size), interpolation=cv2.INTER_LINEAR_EXACT)
+
+    # separable filter on the image flattened to (h, w * c): rows, then columns
+    src = face_arr.reshape(h, w * c).astype(np.float32)
+    rows = filter_axis(src, *resize_taps(h, size), axis=0)
+    out = filter_axis(rows, *pixel_taps(w, size, c), axis=1)
+    return np.clip(np.rint(out), 0, 255).astype(np.uint8).reshape(size, size, c)
+
+
+def preprocess(face_arr: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """
+    NumPy/OpenCV version of torchvision's Resize((224, 224)) -> ToTensor ->
+    Normalize(ImageNet) written into the (3, 224, 224) float32 ``out``.
+    Channels are reversed on the way in, like the cvtColor(BGR2RGB) the
+    model has always been fed through.
+    """
+    chw = resize(face_arr)[..., ::-1].transpose(2, 0, 1)
+    np.multiply(chw, SCALE, out=out)
+    out += OFFSET
+    return out
+
+
+def input_batch_dim(checkpoint_path: Path):
+    """
+    First dimension of the model input read from the graph, without building
+    a session: an int for a fixed batch size, a name for a dynamic axis, or
+    None when the ``onnx`` package is missing.
+    """
+    try:
+        import onnx
+    except ImportError:
+        return None
+    model = onnx.load(checkpoint_path.as_posix(), load_external_data=False)
+    dim = model.graph.input[0].type.tensor_type.shape.dim[0]
+    return dim.dim_value if dim.HasField("dim_value") else dim.dim_param
+
+
+def dynamic_batch_model(checkpoint_path: Path) -> Optional[Path]:
+    """
+    Write a copy of a fixed batch size ONNX model next to it with a symbolic
+    batch axis, so several faces can be scored in one run. Returns None when
+    the ``onnx`` package is missing or the patched graph does not reproduce
+    the original outputs.
+    """
+    dst = checkpoint_path.with_suffix(".dynamic.onnx")
+    if dst.is_file():
+        return dst
+
+    try:
+        import onnx
+        from onnx import numpy_helper
+    except ImportError:
+        print("onnx is not installed, liveness runs one face at a time")
+        return None
+
+    model = onnx.load(checkpoint_path.as_posix())
+    graph = model.graph
+    for value in list(graph.input) + list(graph.output):
+        dim = value.type.tensor_type.shape.dim[0]
+        dim.ClearField("dim_value")
+        dim.dim_param = "batch"
+    # inferred intermediate shapes still carry the old batch size
+    del graph.value_info[:]
+
+    # Reshape targets with the batch size baked in
+    initializers = {t.name: t for t in graph.initializer}
+    for node in graph.node:
+        if node.op_type != "Reshape" or node.input[1] not in initializers:
+            continue
+        tensor = initializers[node.input[1]]
+        shape = numpy_helper.to_array(tensor).copy()
+        if len(shape) and shape[0] == 1 and -1 not in shape:
+            shape[0] = -1
+            tensor.CopyFrom(numpy_helper.from_array(shape, tensor.name))
+
+    try:
+        onnx.checker.check_model(model)
+        patched = onnxruntime.InferenceSession(
+            model.SerializeToString(), providers=["CPUExecutionProvider"]
+        )
+        original = onnxruntime.InferenceSession(
+            checkpoint_path.as_posix(), providers=["CPUExecutionProvider"]
+        )
+        x = np.random.default_rng(0).standard_normal(
+            (2, 3, INPUT_SIZE, INPUT_SIZE), dtype=np.float32
+        )
+        batched = patched.run(None, {"input": x})
+        for i in range(len(x)):
+            for a, b in zip(batched, original.run(None, {"input": x[i : i + 1]})):
+                if not np.allclose(a[i : i + 1].reshape(b.shape), b, atol=1e-4):
+                    raise ValueError("batched outputs differ")
+    except Exception as e:
+        print(f"Could not make a dynamic batch liveness model: {e}")
+        return None
+
+    onnx.save(model, dst.as_posix())
+    print(f"Wrote dynamic batch liveness model to {dst}")
+    return dst
 
 
 class LivenessDetection:
-    def __init__(self, checkpoint_path: str):
+    def __init__(self, checkpoint_path: str, **session_options):
+        # session_options go to OnnxModel (threads, optimization, cache_dir)
         self.pbar = None
         if not Path(checkpoint_path).is_file():
             print("Downloading the DeepPixBiS onnx checkpoint:")
@@ -20,28 +183,56 @@ class LivenessDetection:
                     self.pbar, block_num, block_size, total_size
                 ),
             )
-        self.deepPix = onnxruntime.InferenceSession(
-            checkpoint_path, providers=["CPUExecutionProvider"]
-        )
-        self.trans = T.Compose(
-            [
-                T.Resize((224, 224)),
-                T.ToTensor(),
-                T.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-            ]
+        # only one session is built: the dynamic batch copy when there is or
+        # can be one, else the checkpoint itself
+        path = Path(checkpoint_path)
+        if path.with_suffix(".dynamic.onnx").is_file():
+            path = path.with_suffix(".dynamic.onnx")
+        elif not isinstance(input_batch_dim(path), str):
+            path = dynamic_batch_model(path) or path
+        self.deepPix = OnnxModel(path.as_posix(), **session_options)
+        # faces per run, None when the batch axis is dynamic
+        batch_dim = self.deepPix.batch_dim
+        self.max_batch: Optional[int] = (
+            batch_dim if isinstance(batch_dim, int) else None
         )
+        # input buffers are reused per thread, camera workers share this object
+        self.local = threading.local()
+
+    def input_buffer(self, n: int) -> np.ndarray:
+        buf = getattr(self.local, "input", None)
+        if buf is None or len(buf) < n:
+            buf = np.empty((max(n, 4), 3, INPUT_SIZE, INPUT_SIZE), dtype=np.float32)
+            self.local.input = buf
+        return buf[:n]
+
+    def batch(self, faces: Sequence[np.ndarray]) -> List[float]:
+        """
+        Liveness scores for all ``faces`` of a frame in one run, or one run
+        per face when the model has a fixed batch size.
+        """
+        scores: List[float] = []
+        step = self.max_batch or max(1, len(faces))
+        for i in range(0, len(faces), step):
+            chunk = faces[i : i + step]
+            face_tensor = self.input_buffer(len(chunk))
+            for face_arr, out in zip(chunk, face_tensor):
+                preprocess(face_arr, out)
+            outputs = dict(
+                zip(self.deepPix.output_names, self.deepPix.run({"input": face_tensor}))
+            )
+            output_pixel = outputs["output_pixel"]
+            output_binary = outputs["output_binary"]
+            n = len(chunk)
+            liveness = (
+                output_pixel.reshape(n, -1).mean(axis=1)
+                + output_binary.reshape(n, -1).mean(axis=1)
+            ) / 2.0
+            scores.extend(liveness.tolist())
+        return scores
 
     def __call__(self, face_arr: np.ndarray) -> float:
-        face_rgb = cv2.cvtColor(face_arr, cv2.COLOR_BGR2RGB)
-        face_pil = Image.fromarray(face_rgb)
-        face_tensor = self.trans(face_pil).unsqueeze(0).detach().cpu().numpy()  # type: ignore
-        output_pixel, output_binary = self.deepPix.run(
-            ["output_pixel", "output_binary"], {"input": face_tensor.astype(np.float32)}
-        )
-        liveness_score = (
-            np.mean(output_pixel.flatten()) + np.mean(output_binary.flatten())
-        ) / 2.0
-        return liveness_score
+        return self.batch([face_arr])[0]
 
 
 def show_progress(pbar, block_num, block_size, total_size):
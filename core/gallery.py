@@ -0,0 +1,242 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from core.ann_index import IVFIndex, IVFState
+
+ALIVE = np.iinfo(np.int64).max
+
+
+class GallerySnapshot:
+    """
+    Read-only view of a Gallery at one version. Rows past ``count`` and
+    rows removed after ``version`` are invisible to it, so readers never
+    need the gallery's lock. ``ann`` is the gallery's IVF index at this
+    version, if it has one.
+    """
+
+    __slots__ = (
+        "matrix",
+        "sq_norms",
+        "removed_at",
+        "names",
+        "ids",
+        "count",
+        "version",
+        "ann",
+        "nprobe",
+    )
+
+    def __init__(
+        self,
+        matrix,
+        sq_norms,
+        removed_at,
+        names,
+        ids,
+        count,
+        version,
+        ann=None,
+        nprobe=0,
+    ):
+        self.matrix: np.ndarray = matrix
+        self.sq_norms: np.ndarray = sq_norms
+        self.removed_at: np.ndarray = removed_at
+        self.names: List[str] = names
+        self.ids: List[Optional[str]] = ids
+        self.count: int = count
+        self.version: int = version
+        self.ann: Optional[IVFState] = ann
+        self.nprobe: int = nprobe
+
+    def alive(self) -> np.ndarray:
+        return self.removed_at[: self.count] > self.version
+
+    def __len__(self) -> int:
+        return int(self.alive().sum())
+
+    def distances(self, encoding: np.ndarray) -> np.ndarray:
+        """
+        Euclidean distance (as face_recognition.face_distance) from
+        ``encoding`` to every row, inf for removed rows.
+        """
+        q = np.asarray(encoding, dtype=np.float32)
+        d2 = self.sq_norms[: self.count] - 2 * (self.matrix[: self.count] @ q)
+        d2 += float(q @ q)
+        dist = np.sqrt(np.maximum(d2, 0))
+        dist[~self.alive()] = np.inf
+        return dist
+
+    def best_match(
+        self, encoding: np.ndarray, exact: bool = False
+    ) -> Optional[Tuple[str, float]]:
+        # (name, distance) of the closest live entry, approximate when the
+        # gallery is large enough to be indexed
+        if self.count == 0:
+            return None
+        if self.ann is not None and not exact:
+            found = IVFIndex.search(self.ann, self, encoding, self.nprobe)
+            return None if found is None else (self.names[found[0]], found[1])
+        dist = self.distances(encoding)
+        i = int(np.argmin(dist))
+        if not np.isfinite(dist[i]):
+            return None
+        return self.names[i], float(dist[i])
+
+
+class Gallery:
+    """
+    Face embeddings in one preallocated float32 matrix with their squared
+    norms, indexed by face name and by face id. With an ``ann`` index,
+    matching large galleries searches its inverted lists instead of every
+    row.
+
+    Adds append a row (the matrix doubles when full) and removes stamp the
+    row with the version it disappeared at, both O(1) amortized. Rows are
+    never rewritten in place, so ``snapshot()`` is just the current arrays
+    plus a row count and version; buffers that get replaced on growth or
+    compaction stay alive for the snapshots still holding them. Writers
+    serialize on a lock, readers take none.
+    """
+
+    def __init__(
+        self, dim: int = 128, capacity: int = 64, ann: Optional[IVFIndex] = None
+    ):
+        self.dim = dim
+        self.ann = ann
+        self.lock = threading.Lock()
+        self.index: Dict[str, int] = {}
+        self.names_by_id: Dict[str, str] = {}
+        self.tombstones = 0
+        # bumped whenever rows are renumbered
+        self.compactions = 0
+        self._allocate(max(1, capacity))
+        self.count = 0
+        self.version = 0
+        self._publish()
+
+    def _allocate(self, capacity: int):
+        self.matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        self.sq_norms = np.zeros(capacity, dtype=np.float32)
+        self.removed_at = np.full(capacity, ALIVE, dtype=np.int64)
+        self.names: List[str] = []
+        self.ids: List[Optional[str]] = []
+
+    def _publish(self):
+        if self.ann is not None:
+            self.ann.maintain(self)
+        self._snapshot = GallerySnapshot(
+            self.matrix,
+            self.sq_norms,
+            self.removed_at,
+            self.names,
+            self.ids,
+            self.count,
+            self.version,
+            self.ann.state if self.ann is not None else None,
+            self.ann.nprobe if self.ann is not None else 0,
+        )
+
+    def snapshot(self) -> GallerySnapshot:
+        return self._snapshot
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def names_set(self) -> set:
+        return set(self.index)
+
+    def name_of(self, face_id: str) -> Optional[str]:
+        return self.names_by_id.get(face_id)
+
+    def embedding(self, name: str) -> Optional[np.ndarray]:
+        # copy of a live row, so renames do not need the pickle again
+        with self.lock:
+            row = self.index.get(name)
+            return None if row is None else self.matrix[row].copy()
+
+    def _grow(self):
+        old = (self.matrix, self.sq_norms, self.removed_at, self.names, self.ids)
+        self._allocate(len(self.matrix) * 2)
+        n = self.count
+        self.matrix[:n] = old[0][:n]
+        self.sq_norms[:n] = old[1][:n]
+        self.removed_at[:n] = old[2][:n]
+        self.names = list(old[3])
+        self.ids = list(old[4])
+
+    def _compact(self):
+        # drop removed rows once they make up half the matrix
+        keep = np.flatnonzero(self.removed_at[: self.count] == ALIVE)
+        old = (self.matrix, self.sq_norms, self.names, self.ids)
+        self._allocate(max(64, len(self.matrix)))
+        n = len(keep)
+        self.matrix[:n] = old[0][keep]
+        self.sq_norms[:n] = old[1][keep]
+        self.names = [old[2][i] for i in keep]
+        self.ids = [old[3][i] for i in keep]
+        self.index = {name: row for row, name in enumerate(self.names)}
+        self.count = n
+        self.tombstones = 0
+        self.compactions += 1
+
+    def _add(self, name: str, embedding: np.ndarray, face_id: Optional[str]):
+        if name in self.index:
+            self._remove(name)
+        if self.count == len(self.matrix):
+            self._grow()
+        row = self.count
+        vec = np.asarray(embedding, dtype=np.float32).reshape(self.dim)
+        self.matrix[row] = vec
+        self.sq_norms[row] = vec @ vec
+        self.removed_at[row] = ALIVE
+        self.names.append(name)
+        self.ids.append(face_id)
+        self.index[name] = row
+        if face_id is not None:
+            self.names_by_id[face_id] = name
+        self.count += 1
+
+    def _remove(self, name: str) -> bool:
+        row = self.index.pop(name, None)
+        if row is None:
+            return False
+        self.removed_at[row] = self.version
+        self.tombstones += 1
+        face_id = self.ids[row]
+        if face_id is not None and self.names_by_id.get(face_id) == name:
+            del self.names_by_id[face_id]
+        return True
+
+    def add(self, name: str, embedding: np.ndarray, face_id: Optional[str] = None):
+        with self.lock:
+            self.version += 1
+            self._add(name, embedding, face_id)
+            self._publish()
+
+    def remove(self, name: str) -> bool:
+        with self.lock:
+            self.version += 1
+            removed = self._remove(name)
+            if self.tombstones * 2 > self.count:
+                self._compact()
+            self._publish()
+            return removed
+
+    def update(
+        self,
+        add: Iterable[Tuple[str, np.ndarray, Optional[str]]] = (),
+        remove: Iterable[str] = (),
+    ):
+        # apply a batch of changes as one new version
+        with self.lock:
+            self.version += 1
+            for name in remove:
+                self._remove(name)
+            for name, embedding, face_id in add:
+                self._add(name, embedding, face_id)
+            if self.tombstones * 2 > self.count:
+                self._compact()
+            self._publish()
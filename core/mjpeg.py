@@ -0,0 +1,233 @@
+from typing import Iterator, Optional, Tuple
+import cv2
+import numpy as np
+
+SOI = b"\xff\xd8"
+EOI = b"\xff\xd9"
+HEADER_END = b"\r\n\r\n"
+
+Part = Tuple[memoryview, float]
+
+# Baseline, extended, progressive and lossless start-of-frame markers
+SOF_MARKERS = {
+    0xC0,
+    0xC1,
+    0xC2,
+    0xC3,
+    0xC5,
+    0xC6,
+    0xC7,
+    0xC9,
+    0xCA,
+    0xCB,
+    0xCD,
+    0xCE,
+    0xCF,
+}
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def parse_boundary(content_type: str) -> Optional[bytes]:
+    # multipart/x-mixed-replace;boundary=123456789000000000000987654321
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "boundary" and value:
+            return value.strip('"').encode()
+    return None
+
+
+def _parse_headers(raw: bytes) -> Tuple[Optional[int], float]:
+    length = None
+    timestamp = 0.0
+    for line in raw.split(b"\r\n"):
+        key, _, value = line.partition(b":")
+        key = key.strip().lower()
+        try:
+            if key == b"content-length":
+                length = int(value)
+            elif key == b"x-timestamp":
+                timestamp = float(value)
+        except ValueError:
+            pass
+    return length, timestamp
+
+
+class MJPEGParser:
+    """
+    Incremental parser for multipart MJPEG streams such as the one served by
+    the ESP32 firmware on :81/stream.
+
+    Bytes are copied once into a reusable buffer and JPEG payloads are handed
+    out as memoryviews into that buffer, ready for
+    ``cv2.imdecode(np.frombuffer(jpg, np.uint8), ...)``. A view is only valid
+    until the next call to ``feed``.
+
+    When the part carries a ``Content-Length`` header the payload is sliced by
+    length; otherwise (or without a boundary) it falls back to scanning for the
+    JPEG end marker, resuming from where the previous scan stopped.
+    """
+
+    def __init__(self, boundary: Optional[bytes] = None, buffer_size: int = 256 * 1024):
+        self.marker = b"--" + boundary if boundary else SOI
+        self.buf = bytearray(buffer_size)
+        self.view = memoryview(self.buf)
+        self.frames_parsed = 0
+
+        self._start = 0  # first unconsumed byte
+        self._end = 0  # end of valid data
+        self._scan = 0  # where the next search resumes
+        self._body = -1  # start of the current payload, -1 while looking for a part
+        self._length: Optional[int] = None
+        self._timestamp = 0.0
+
+    def feed(self, data) -> None:
+        n = len(data)
+        if self._end + n > len(self.buf):
+            self._make_room(n)
+        self.view[self._end : self._end + n] = data
+        self._end += n
+
+    def frames(self) -> Iterator[Part]:
+        while True:
+            part = self._next_part()
+            if part is None:
+                return
+            yield part
+
+    def reset(self):
+        self._start = self._end = self._scan = 0
+        self._body = -1
+        self._length = None
+
+    def _make_room(self, n: int):
+        pending = self._end - self._start
+        if pending + n > len(self.buf):
+            buf = bytearray(max(2 * len(self.buf), pending + n))
+            view = memoryview(buf)
+            view[:pending] = self.view[self._start : self._end]
+            # previous views stay valid, they keep the old buffer alive
+            self.buf, self.view = buf, view
+        elif pending:
+            self.view[:pending] = self.view[self._start : self._end]
+
+        shift = self._start
+        self._scan -= shift
+        if self._body >= 0:
+            self._body -= shift
+        self._start = 0
+        self._end = pending
+
+    def _find_part(self) -> bool:
+        buf = self.buf
+        i = buf.find(self.marker, self._scan, self._end)
+        if i < 0:
+            # keep a partial marker at the tail for the next feed
+            self._start = self._scan = max(
+                self._start, self._end - len(self.marker) + 1
+            )
+            return False
+
+        self._start = self._scan = i
+        if self.marker == SOI:
+            self._body = i
+            self._length = None
+            self._scan = i + len(SOI)
+            return True
+
+        h_end = buf.find(HEADER_END, i, self._end)
+        if h_end < 0:
+            return False
+
+        self._length, self._timestamp = _parse_headers(
+            bytes(self.view[i + len(self.marker) : h_end])
+        )
+        self._body = self._scan = h_end + len(HEADER_END)
+        return True
+
+    def _next_part(self) -> Optional[Part]:
+        if self._body < 0 and not self._find_part():
+            return None
+
+        if self._length is not None:
+            stop = self._body + self._length
+            if stop > self._end:
+                return None
+        else:
+            j = self.buf.find(EOI, self._scan, self._end)
+            if j < 0:
+                self._scan = max(self._body, self._end - 1)
+                return None
+            stop = j + len(EOI)
+
+        jpg = self.view[self._body : stop]
+        self._start = self._scan = stop
+        self._body = -1
+        self.frames_parsed += 1
+        return jpg, self._timestamp
+
+
+def jpeg_size(jpg) -> Optional[Tuple[int, int]]:
+    """
+    Read (width, height) from the JPEG start-of-frame header without decoding.
+    """
+    data = memoryview(jpg)
+    n = len(data)
+    i = 2
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # markers without a length field
+            i += 2
+            continue
+        if marker in SOF_MARKERS:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        i += 2 + ((data[i + 2] << 8) | data[i + 3])
+    return None
+
+
+def reduction_flag(width: int, target_width: int) -> Tuple[int, int]:
+    """
+    Pick the largest DCT scaling (1/8, 1/4, 1/2) that still decodes at least
+    ``target_width`` pixels wide. Returns (imread flag, factor).
+    """
+    if target_width > 0:
+        for factor, flag in REDUCED_FLAGS:
+            if -(-width // factor) >= target_width:
+                return flag, factor
+    return cv2.IMREAD_COLOR, 1
+
+
+def decode_jpeg(jpg, target_width: int = 0) -> Optional[np.ndarray]:
+    """
+    Decode a JPEG, letting libjpeg skip the detail that a ``target_width``
+    wide frame would throw away anyway. ``target_width=0`` decodes full size.
+    """
+    flag = cv2.IMREAD_COLOR
+    if target_width > 0:
+        size = jpeg_size(jpg)
+        if size is not None:
+            flag, _ = reduction_flag(size[0], target_width)
+    return cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), flag)
+
+
+def fit_width(
+    frame: np.ndarray, target_width: int, interpolation: int = cv2.INTER_NEAREST
+) -> np.ndarray:
+    # Only resample what decode-time scaling could not reach exactly
+    height, width = frame.shape[:2]
+    if target_width <= 0 or width == target_width:
+        return frame
+    target_height = max(1, round(height * target_width / width))
+    return cv2.resize(frame, (target_width, target_height), interpolation=interpolation)
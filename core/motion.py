@@ -0,0 +1,46 @@
+from typing import Optional
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap motion check on a tiny blurred grayscale thumbnail. The frame is
+    compared against a slowly updated background (running average), so
+    lighting drift is absorbed while people walking in are not.
+
+    ``level`` is the share of thumbnail pixels that differ from the
+    background by more than ``pixel_threshold``.
+    """
+
+    def __init__(self, width: int = 64, pixel_threshold: int = 20, alpha: float = 0.05):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.alpha = alpha
+        self.background: Optional[np.ndarray] = None
+        self.level = 0.0
+
+    def reset(self):
+        self.background = None
+        self.level = 0.0
+
+    def update(self, frame: np.ndarray, min_level: float) -> bool:
+        h, w = frame.shape[:2]
+        small = cv2.resize(
+            frame,
+            (self.width, max(1, round(h * self.width / w))),
+            interpolation=cv2.INTER_AREA,
+        )
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(small, (3, 3), 0).astype(np.float32)
+
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray
+            self.level = 1.0
+            return True
+
+        diff = cv2.absdiff(gray, self.background)
+        self.level = float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+        cv2.accumulateWeighted(gray, self.background, self.alpha)
+        return self.level >= min_level
@@ -0,0 +1,217 @@
+from collections import deque
+import hashlib
+from pathlib import Path
+import platform
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import onnxruntime
+
+OPTIMIZATION_LEVELS = {
+    "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+ONNX_DTYPES = {
+    "tensor(float)": np.float32,
+    "tensor(float16)": np.float16,
+    "tensor(double)": np.float64,
+    "tensor(int64)": np.int64,
+    "tensor(int32)": np.int32,
+    "tensor(int8)": np.int8,
+    "tensor(uint8)": np.uint8,
+    "tensor(bool)": np.bool_,
+}
+
+
+class LatencyHistogram:
+    """
+    Per-call latency counts in fixed millisecond buckets, plus the most
+    recent samples for percentiles.
+    """
+
+    BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+    def __init__(self, recent: int = 1024):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.recent: deque[float] = deque(maxlen=recent)
+        self.count = 0
+        self.total_ms = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float):
+        ms = seconds * 1e3
+        bucket = int(np.searchsorted(self.BOUNDS_MS, ms))
+        with self.lock:
+            self.counts[bucket] += 1
+            self.recent.append(ms)
+            self.count += 1
+            self.total_ms += ms
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            recent = np.array(self.recent)
+            labels = [f"<={b}" for b in self.BOUNDS_MS] + [f">{self.BOUNDS_MS[-1]}"]
+            return {
+                "count": self.count,
+                "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0,
+                "p50_ms": (
+                    round(float(np.percentile(recent, 50)), 3) if len(recent) else 0
+                ),
+                "p95_ms": (
+                    round(float(np.percentile(recent, 95)), 3) if len(recent) else 0
+                ),
+                "buckets_ms": dict(zip(labels, self.counts)),
+            }
+
+
+def cached_model_path(
+    model_path: Path, cache_dir: Path, optimization: str, intra_op_threads: int
+) -> Path:
+    # optimized graphs depend on the source model, the level, the runtime and
+    # the cpu (the "all" level bakes in hardware specific kernels)
+    stat = model_path.stat()
+    key = "|".join(
+        [
+            model_path.resolve().as_posix(),
+            str(stat.st_size),
+            str(stat.st_mtime_ns),
+            optimization,
+            str(intra_op_threads),
+            onnxruntime.__version__,
+            platform.machine(),
+        ]
+    )
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return cache_dir / f"{model_path.stem}.{optimization}.{digest}.ort.onnx"
+
+
+class OnnxModel:
+    """
+    ONNX Runtime session for the project's models.
+
+    Thread counts and the graph optimization level are configurable. With a
+    ``cache_dir`` the optimized graph is serialized on first load and later
+    loads skip the optimization passes. ``run`` binds inputs and outputs with
+    IO binding; output buffers are preallocated per batch size and per
+    thread and are reused, so results are only valid until the next call
+    from the same thread.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 0,
+        optimization: str = "all",
+        cache_dir: Optional[Path] = None,
+        providers: Sequence[str] = ("CPUExecutionProvider",),
+    ):
+        if optimization not in OPTIMIZATION_LEVELS:
+            raise ValueError(f"Unknown graph optimization level: {optimization}")
+
+        self.model_path = Path(model_path)
+        self.providers = list(providers)
+        self.latency = LatencyHistogram()
+        self.local = threading.local()
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        if inter_op_threads > 1:
+            options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+        options.graph_optimization_level = OPTIMIZATION_LEVELS[optimization]
+
+        self.session: Optional[onnxruntime.InferenceSession] = None
+        if cache_dir is not None and optimization != "disable":
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            cached = cached_model_path(
+                self.model_path, cache_dir, optimization, intra_op_threads
+            )
+            self.session = self.load_cached(cached, options)
+            if self.session is None:
+                options.optimized_model_filepath = cached.as_posix()
+
+        if self.session is None:
+            self.session = onnxruntime.InferenceSession(
+                self.model_path.as_posix(), options, providers=self.providers
+            )
+
+        self.inputs = self.session.get_inputs()
+        self.outputs = self.session.get_outputs()
+        self.input_names = [i.name for i in self.inputs]
+        self.output_names = [o.name for o in self.outputs]
+
+    def load_cached(
+        self, cached: Path, options: onnxruntime.SessionOptions
+    ) -> Optional[onnxruntime.InferenceSession]:
+        if not cached.is_file():
+            return None
+        level = options.graph_optimization_level
+        options.graph_optimization_level = OPTIMIZATION_LEVELS["disable"]
+        try:
+            return onnxruntime.InferenceSession(
+                cached.as_posix(), options, providers=self.providers
+            )
+        except Exception as e:
+            print(f"Dropping unreadable optimized model {cached}: {e}")
+            cached.unlink(missing_ok=True)
+            return None
+        finally:
+            options.graph_optimization_level = level
+
+    @property
+    def batch_dim(self):
+        # int for a fixed batch size, a name (or None) for a dynamic axis
+        return self.inputs[0].shape[0]
+
+    def output_buffers(self, batch: int) -> Optional[List[np.ndarray]]:
+        buffers = getattr(self.local, "outputs", None)
+        if buffers is None:
+            buffers = self.local.outputs = {}
+        if batch not in buffers:
+            arrays = []
+            for out in self.outputs:
+                dims = [d if isinstance(d, int) else None for d in out.shape]
+                if dims and dims[0] is None:
+                    dims[0] = batch
+                if any(d is None for d in dims) or out.type not in ONNX_DTYPES:
+                    # unknown shape, let onnxruntime allocate it
+                    buffers[batch] = None
+                    return None
+                arrays.append(np.empty(dims, dtype=ONNX_DTYPES[out.type]))
+            buffers[batch] = arrays
+        return buffers[batch]
+
+    def binding(self) -> onnxruntime.IOBinding:
+        binding = getattr(self.local, "binding", None)
+        if binding is None:
+            binding = self.local.binding = self.session.io_binding()  # type: ignore
+        return binding
+
+    def run(self, inputs: Dict[str, np.ndarray]) -> List[np.ndarray]:
+        binding = self.binding()
+        for name, arr in inputs.items():
+            binding.bind_cpu_input(name, np.ascontiguousarray(arr))
+
+        batch = len(next(iter(inputs.values())))
+        buffers = self.output_buffers(batch)
+        for i, name in enumerate(self.output_names):
+            if buffers is None:
+                binding.bind_output(name, "cpu")
+            else:
+                buf = buffers[i]
+                binding.bind_output(
+                    name, "cpu", 0, buf.dtype, list(buf.shape), buf.ctypes.data
+                )
+
+        start = time.perf_counter()
+        self.session.run_with_iobinding(binding)  # type: ignore
+        self.latency.add(time.perf_counter() - start)
+
+        if buffers is None:
+            return binding.copy_outputs_to_cpu()
+        return buffers
@@ -0,0 +1,726 @@
+from contextlib import contextmanager
+import json
+import os
+from pathlib import Path
+from queue import Queue
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple
+import cv2
+import numpy as np
+from core.controller import (
+    ScreenResolution,
+    check_and_set_framesize,
+    discover_in_background,
+    get_actuator,
+    get_status_poller,
+    get_video_url,
+    set_flash,
+    set_framesize,
+)
+from core.esp32_camera import (
+    get_stream_reader,
+    get_video_feed,
+    readers,
+    stop_stream_reader,
+)
+from core.face import (
+    check_door,
+    recognition_pool,
+    recognize_faces,
+    rematch_cached,
+    start_recognizing,
+)
+from core.face_detection import (
+    DETECTORS,
+    FaceDetector,
+    clip_box,
+    create_face_detector,
+)
+from core.face_liveness import LivenessDetection
+from core.mjpeg import fit_width
+from core.motion import MotionGate
+from core.recognition import (
+    PRIORITY_DOOR,
+    PRIORITY_NEW,
+    PRIORITY_RECHECK,
+    TrackRecognition,
+    crop_quality,
+)
+from core.tracking import BoxTracker, transform_points
+from core.webcam import get_remote_webcam_feed, get_webcam_feed, grabbers
+from models.config import CameraConfig, settings
+from models.face import Face
+from models.helpers import Box
+from utils.constants import (
+    FILE_PERMS,
+    camera_frame_path,
+    cameras_path,
+    deepPix_checkpoint_path,
+    deepPix_int8_checkpoint_path,
+    img_folder,
+    ort_cache_path,
+    should_run_thread,
+)
+from utils.visualize_helpers import draw_faces
+
+ESP32_PREFIX = "esp32://"
+
+# a tracked face whose box overlaps its last liveness box by less than this
+# is rescored before liveness_every_k frames have passed
+LIVENESS_BOX_IOU = 0.7
+
+no_cam_img_path = "imgs/no-cam.png"
+
+# Higher quality JPEG compression for better visualization
+encode_params = [
+    int(cv2.IMWRITE_JPEG_QUALITY),
+    85,
+    int(cv2.IMWRITE_JPEG_OPTIMIZE),
+    1,
+    int(cv2.IMWRITE_JPEG_PROGRESSIVE),
+    1,
+]
+
+
+def esp32_ip_for(cam: str) -> Optional[str]:
+    if cam == "esp32":
+        return settings.esp32_ip
+    if cam.startswith(ESP32_PREFIX):
+        return cam[len(ESP32_PREFIX) :].strip("/")
+    return None
+
+
+def get_frame(cam: str, target_width: int = 0):
+    # target_width lets JPEG sources decode straight at (or near) the size used
+    if cam == "esp32":
+        url = get_video_url(settings.esp32_ip)
+        # drop readers left over from a previous camera ip
+        for old_url in [u for u in readers if u != url]:
+            stop_stream_reader(old_url)
+
+        reader = get_stream_reader(url)
+        if reader.failures >= 3:
+            # search off the video loop; the reader is recreated on the next call
+            if discover_in_background():
+                print("Error getting video feed, searching for esp32 camera...")
+                stop_stream_reader(url)
+            return None
+
+        return get_video_feed(url, target_width)
+
+    elif cam.startswith(ESP32_PREFIX):
+        # fixed address, no discovery
+        return get_video_feed(get_video_url(esp32_ip_for(cam)), target_width)
+
+    elif cam.startswith("tcp://"):
+        # frames served by scripts/webcam_sender.py
+        return get_remote_webcam_feed(cam, target_width)
+
+    elif (
+        cam.isnumeric()
+        or cam.startswith("http")
+        or cam.startswith("rtsp")
+        or Path(cam).exists()
+    ):
+        return get_webcam_feed(cam if not cam.isnumeric() else int(cam))
+
+    elif "demo" in cam:
+        path = "https://videos.pexels.com/video-files/3981739/3981739-uhd_3840_2160_30fps.mp4"
+        return get_webcam_feed(path, repeat=True)
+
+    else:
+        raise ValueError("Invalid camera source")
+
+
+def source_stats(cam: str) -> dict:
+    ip = esp32_ip_for(cam)
+    if ip:
+        reader = readers.get(get_video_url(ip))
+        if reader is None:
+            return {}
+        return {"seq": reader.seq, "failures": reader.failures}
+
+    grabber = grabbers.get(int(cam) if cam.isnumeric() else cam)
+    return grabber.stats() if grabber is not None else {}
+
+
+def recognition_crop(
+    full: np.ndarray,
+    box: Box,
+    landmarks: Optional[np.ndarray],
+    scale: float,
+    target_width: int = 0,
+) -> dict:
+    """
+    Cut the face at ``box`` (proxy coordinates, ``scale`` times smaller than
+    ``full``) out of the full frame with room around it for alignment, and
+    return it as RGB with the box and landmarks moved into the crop. When
+    ``full`` is wider than ``target_width`` only the crop is shrunk to that
+    frame width. The recognition queue then holds only the crop, not the
+    whole frame.
+    """
+    height, width = full.shape[:2]
+    b = box.scale_copy(scale)
+    mx, my = b.width // 2, b.height // 2
+    x0, y0 = max(0, b.left - mx), max(0, b.top - my)
+    x1, y1 = min(width, b.right + mx), min(height, b.bottom + my)
+    crop = cv2.cvtColor(full[y0:y1, x0:x1], cv2.COLOR_BGR2RGB)
+    b = Box(top=b.top - y0, right=b.right - x0, bottom=b.bottom - y0, left=b.left - x0)
+    if landmarks is not None:
+        landmarks = landmarks * scale - np.array([x0, y0], np.float32)
+
+    if 0 < target_width < width:
+        factor = target_width / width
+        size = (max(1, round((x1 - x0) * factor)), max(1, round((y1 - y0) * factor)))
+        crop = cv2.resize(crop, size, interpolation=cv2.INTER_AREA)
+        b = b.scale_copy(factor)
+        if landmarks is not None:
+            landmarks = landmarks * factor
+    return {"frame": crop, "box": b, "landmarks": landmarks}
+
+
+def liveness_checkpoint(variant: str) -> Path:
+    if variant == "int8":
+        if deepPix_int8_checkpoint_path.is_file():
+            return deepPix_int8_checkpoint_path
+        print("No int8 liveness model, run scripts/quantize_liveness.py; using float32")
+    elif variant != "float32":
+        print(f"Unknown liveness model {variant}, using float32")
+    return deepPix_checkpoint_path
+
+
+class InferencePool:
+    """
+    Detector and liveness capacity shared by every camera worker. At most
+    ``size`` frames are analysed at once no matter how many cameras run.
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self.liveness = LivenessDetection(
+            checkpoint_path=liveness_checkpoint(settings.liveness_model).as_posix(),
+            intra_op_threads=settings.onnx_intra_op_threads,
+            inter_op_threads=settings.onnx_inter_op_threads,
+            optimization=settings.onnx_optimization,
+            cache_dir=ort_cache_path,
+        )
+        # Detector graphs are not thread safe, every slot gets its own.
+        # Stateful detectors track one stream, so every camera worker owns
+        # one instead and the slots only bound how many frames run at once.
+        detector_class = DETECTORS.get(settings.face_detector)
+        self.stateful = detector_class is not None and detector_class.stateful
+        self.detectors: Queue[Optional[FaceDetector]] = Queue()
+        for _ in range(self.size):
+            self.detectors.put(None if self.stateful else self.new_detector())
+
+    def new_detector(self) -> FaceDetector:
+        return create_face_detector(
+            settings.face_detector, max_num_faces=settings.max_face_detection
+        )
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.size,
+            "liveness_latency": self.liveness.deepPix.latency.to_dict(),
+        }
+
+    @contextmanager
+    def acquire(
+        self, own: Optional[FaceDetector] = None
+    ) -> Iterator[Tuple[FaceDetector, LivenessDetection]]:
+        # ``own`` is the caller's stateful detector, used in place of the slot's
+        detector = self.detectors.get()
+        try:
+            yield own or detector, self.liveness  # type: ignore
+        finally:
+            self.detectors.put(detector)
+
+
+class CameraWorker:
+    def __init__(self, camera: CameraConfig, pool: InferencePool):
+        self.camera = camera
+        self.id = camera.id
+        self.source = camera.source
+        self.pool = pool
+        self.detector = pool.new_detector() if pool.stateful else None
+        self.frame_path = camera_frame_path(self.id)
+        self.detected_faces: dict[str, Face] = {}
+        self.tracker = BoxTracker()
+        self.since_detection = 0
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+
+        self.frames = 0
+        self.fps = 0.0
+        self.last_frame_time = 0.0
+        self.is_frame_available = False
+        self.detections = 0
+        self.tracked_frames = 0
+        self.liveness_runs = 0
+        self.recognitions = 0
+        self.recognitions_skipped = 0
+
+        self.motion = MotionGate()
+        self.last_processed = 0.0
+        self.last_loop_time = 0.0
+        self.active_time = 0.0
+        self.idle_time = 0.0
+        self.skipped_frames = 0
+        self.process_cpu = 0.0
+        self.cpu_saved = 0.0
+
+    @property
+    def esp32_ip(self) -> Optional[str]:
+        return esp32_ip_for(self.source)
+
+    @property
+    def actuator_ip(self) -> Optional[str]:
+        # the "esp32" source follows settings.esp32_ip through discovery
+        return None if self.source == "esp32" else self.esp32_ip
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        # True once the worker thread has exited
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+        return self.thread is None or not self.thread.is_alive()
+
+    def stats(self) -> dict:
+        return {
+            "id": self.id,
+            "source": self.source,
+            "frame_path": str(self.frame_path),
+            "available": self.is_frame_available,
+            "frames": self.frames,
+            "fps": round(self.fps, 2),
+            "last_frame_time": self.last_frame_time,
+            "faces": len(self.detected_faces),
+            "detections": self.detections,
+            "tracked_frames": self.tracked_frames,
+            "liveness_runs": self.liveness_runs,
+            "recognitions": self.recognitions,
+            "recognitions_skipped": self.recognitions_skipped,
+            "motion": {
+                "level": round(self.motion.level, 4),
+                "active_s": round(self.active_time, 1),
+                "idle_s": round(self.idle_time, 1),
+                "skipped_frames": self.skipped_frames,
+                "cpu_saved_s": round(self.cpu_saved, 2),
+            },
+            "capture": source_stats(self.source),
+            "actuator": (
+                get_actuator(self.actuator_ip).to_dict() if self.esp32_ip else None
+            ),
+            "status": (
+                get_status_poller(self.actuator_ip).to_dict() if self.esp32_ip else None
+            ),
+        }
+
+    def run(self):
+        window = f"Video {self.id}"
+        if settings.show_video:
+            cv2.namedWindow(window, cv2.WINDOW_NORMAL)
+            cv2.resizeWindow(window, 800, 600)
+
+        if self.esp32_ip:
+            set_framesize(ScreenResolution.SXGA_1280_1024, ip=self.actuator_ip)
+            set_flash(0, ip=self.actuator_ip)
+            poller = get_status_poller(self.actuator_ip)
+            if not poller.on_update:
+                ip = self.actuator_ip
+                poller.on_update.append(lambda s: check_and_set_framesize(s, ip=ip))
+
+        no_cam_frame = cv2.imread(no_cam_img_path)
+        last_frame = None
+
+        print(f"Starting video feed {self.id} ({self.source})...")
+        while self.running and should_run_thread.value:
+            try:
+                # decode no wider than the proxy unless recognition_width asks
+                frame = get_frame(
+                    self.source, max(settings.frame_width, settings.recognition_width)
+                )
+                # Stream readers hand back the same array until a newer frame arrives
+                if frame is not None and frame is last_frame:
+                    time.sleep(0.005)
+                    continue
+                last_frame = frame
+
+                if frame is None:
+                    frame = no_cam_frame
+                    self.is_frame_available = False
+                else:
+                    self.is_frame_available = True
+
+                if self.is_frame_available:
+                    # small proxy for detection/tracking; crops come from the
+                    # source frame, and only they are scaled to recognition_width
+                    full = frame
+                    frame = fit_width(full, settings.frame_width, cv2.INTER_AREA)
+                    if self.should_process(frame):
+                        cpu_start = time.thread_time()
+                        self.publish(frame)
+                        self.process(frame, full)
+                        cpu = time.thread_time() - cpu_start
+                        self.process_cpu = (
+                            0.9 * self.process_cpu + 0.1 * cpu
+                            if self.process_cpu
+                            else cpu
+                        )
+                        self.update_fps()
+                    else:
+                        self.skipped_frames += 1
+                        self.cpu_saved += self.process_cpu
+
+                if settings.show_video:
+                    cv2.imshow(window, frame)
+                    if cv2.waitKey(1) & 0xFF == ord("q"):
+                        settings.set("show_video", 0)
+                else:
+                    cv2.destroyAllWindows()
+
+                if settings.fps:
+                    time.sleep(1 / settings.fps)
+
+                time.sleep(0.001)
+
+            except Exception as e:
+                print(f"Error in camera {self.id} loop: {e}")
+                time.sleep(0.05)
+
+        if self.esp32_ip:
+            set_flash(0, ip=self.actuator_ip)
+
+    def should_process(self, frame: np.ndarray) -> bool:
+        """
+        Motion gate: frames run through detection while something moves or
+        faces are being tracked; a static empty scene is still checked
+        every ``idle_detect_interval`` seconds.
+        """
+        now = time.time()
+        dt = now - self.last_loop_time if self.last_loop_time else 0.0
+        self.last_loop_time = now
+
+        active = (
+            settings.motion_threshold <= 0
+            or self.motion.update(frame, settings.motion_threshold)
+            or len(self.detected_faces) > 0
+        )
+        if active:
+            self.active_time += dt
+        else:
+            self.idle_time += dt
+
+        if active:
+            self.last_processed = now
+            return True
+        if now - self.last_processed >= settings.idle_detect_interval:
+            # an idle check has to reach the detector, not the tracker
+            self.since_detection = settings.detect_every_n
+            self.last_processed = now
+            return True
+        return False
+
+    def update_fps(self):
+        now = time.time()
+        if self.last_frame_time:
+            dt = now - self.last_frame_time
+            if dt > 0:
+                self.fps = 0.9 * self.fps + 0.1 * (1 / dt) if self.fps else 1 / dt
+        self.last_frame_time = now
+        self.frames += 1
+
+    def publish(self, frame: np.ndarray):
+        # Draw faces on a copy so detection sees the clean frame
+        drawing_frame = frame.copy()
+        if len(self.detected_faces) > 0:
+            drawing_frame = draw_faces(
+                drawing_frame, list(self.detected_faces.values())
+            )
+
+        success, buffer = cv2.imencode(".jpg", drawing_frame, encode_params)
+        if not success:
+            return
+
+        # Write directly to file instead of using temporary file
+        try:
+            with open(self.frame_path, "wb") as f:
+                f.write(buffer.tobytes())
+            os.chmod(self.frame_path, FILE_PERMS)
+        except Exception as e:
+            print(f"Frame write error: {e}")
+
+    def process(self, frame: np.ndarray, full: np.ndarray):
+        gray = self.tracker.prepare(frame)
+        self.since_detection += 1
+        if self.since_detection < max(1, settings.detect_every_n) and self.track(
+            frame, gray
+        ):
+            self.tracked_frames += 1
+            return
+
+        self.detect(frame, full)
+        self.detections += 1
+        self.since_detection = 0
+        self.tracker.reset(gray, {k: v.bbox for k, v in self.detected_faces.items()})
+
+    def track(self, frame: np.ndarray, gray: np.ndarray) -> bool:
+        """
+        Move the known faces along with the optical flow instead of running
+        the detector. Returns False when a track is lost so the caller
+        detects on this frame instead.
+        """
+        tracks = self.tracker.track(gray)
+        if any(
+            tracks.get(k, (None, 0.0))[1] < settings.track_min_confidence
+            for k in self.detected_faces
+        ):
+            return False
+
+        frame_height, frame_width = frame.shape[:2]
+        for k, face in self.detected_faces.items():
+            old_box = face.bbox
+            new_box, _ = tracks[k]
+            lm = face.state.get("landmarks")
+            if lm is not None:
+                face.state["landmarks"] = transform_points(lm, old_box, new_box)
+            face.bbox = clip_box(
+                new_box.left,
+                new_box.top,
+                new_box.right,
+                new_box.bottom,
+                frame_width,
+                frame_height,
+            )
+            face.near = face.bbox.near_frame(frame_width, frame_height)
+            # liveness keeps the value from the last detection
+            face.live_update(face)
+        return True
+
+    def detect(self, frame: np.ndarray, full: np.ndarray):
+        """
+        Detect on the ``frame`` proxy, score liveness and save face images
+        from crops of ``full``. Boxes and landmarks kept on Face objects are
+        in proxy coordinates.
+        """
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        frame_height, frame_width = frame.shape[:2]
+        scale = full.shape[1] / frame_width
+
+        with self.pool.acquire(self.detector) as (faceDetector, livenessDetector):
+            # crops come out of the BGR full frame, only they get converted
+            crops, boxes, landmarks = faceDetector(frame_rgb, source=full)
+            tracks = self.match(boxes)
+            rescore = [
+                i for i, box in enumerate(boxes) if self.needs_liveness(tracks[i], box)
+            ]
+            scores = livenessDetector.batch(
+                [cv2.cvtColor(crops[i], cv2.COLOR_BGR2RGB) for i in rescore]
+            )
+        liveness = dict(zip(rescore, scores))
+        self.liveness_runs += len(rescore)
+
+        detected_faces = self.detected_faces
+        matched_ids = []
+        for i, (crop, box, lm, track) in enumerate(
+            zip(crops, boxes, landmarks, tracks)
+        ):
+            face = track if track is not None else Face(bbox=box)
+            if i in liveness:
+                face.update_liveness(liveness[i], settings.liveness_ema_alpha)
+                face.state["liveness_frame"] = self.frames
+                face.state["liveness_box"] = box
+            # detector landmarks let recognition skip dlib's landmark pass
+            face.state["landmarks"] = lm
+
+            if track is not None:
+                matched_ids.append(track.id)
+                track.bbox = box
+                track.near = box.near_frame(frame_width, frame_height)
+                track.active = True
+                track.live_update(track)
+                if i in liveness and track.is_loaded and not track.is_unknown:
+                    check_door(track)
+            else:
+                face.near = face.bbox.near_frame(frame_width, frame_height)
+                face_path = str(img_folder / f"{face.id}.jpg")
+                cv2.imwrite(face_path, crop)
+                face.face_image_path = face_path
+                cache = face.state["recognition"] = TrackRecognition()
+                if start_recognizing(
+                    face=face,
+                    tolerance=settings.face_detection_threshold,
+                    priority=PRIORITY_NEW,
+                    **recognition_crop(
+                        full, face.bbox, lm, scale, settings.recognition_width
+                    ),
+                ):
+                    cache.attempt(time.time(), crop_quality(frame, face.bbox))
+                    self.recognitions += 1
+                detected_faces[face.id] = face
+                matched_ids.append(face.id)
+
+        new_detected_faces = {}
+        for k, v in detected_faces.items():
+            if k in matched_ids:
+                new_detected_faces[k] = v
+
+                if v.is_loaded:
+                    self.recheck(v, frame, full, scale)
+            else:
+                v.active = False
+                v.live_update(v)
+
+        self.detected_faces = new_detected_faces
+
+    def recheck(self, face: Face, frame: np.ndarray, full: np.ndarray, scale: float):
+        """
+        Recognize a tracked face again only when its TrackRecognition cache
+        says so. Unknown faces first try their cached embedding against a
+        gallery that changed since, then back off between encodes unless a
+        clearly better crop shows up; known faces are re-verified on a long
+        interval.
+        """
+        tolerance = settings.face_detection_threshold
+        cache = face.state.setdefault("recognition", TrackRecognition())
+        if face.is_unknown and rematch_cached(face, tolerance):
+            return
+
+        now = time.time()
+        quality = crop_quality(frame, face.bbox)
+        if not cache.due(
+            now,
+            not face.is_unknown,
+            quality,
+            settings.recognition_retry_base,
+            settings.recognition_retry_max,
+            settings.recognition_verify_interval,
+            settings.recognition_quality_gain,
+        ):
+            self.recognitions_skipped += 1
+            return
+
+        if face.near <= settings.door_zone_near:
+            priority = PRIORITY_DOOR
+        else:
+            priority = PRIORITY_RECHECK
+        if start_recognizing(
+            face=face,
+            tolerance=tolerance,
+            priority=priority,
+            **recognition_crop(
+                full,
+                face.bbox,
+                face.state.get("landmarks"),
+                scale,
+                settings.recognition_width,
+            ),
+        ):
+            cache.attempt(now, quality)
+            self.recognitions += 1
+
+    def match(self, boxes: List[Box]) -> List[Optional[Face]]:
+        """
+        Pair detections with the faces already tracked. Each face is given
+        to the first box overlapping it by more than 0.6 IoU, a lower bar
+        than 0.8 so different people are less likely to be merged.
+        """
+        free = dict(self.detected_faces)
+        tracks: List[Optional[Face]] = []
+        for box in boxes:
+            best = max(
+                free.values(), key=lambda f: box.match_percentage(f.bbox), default=None
+            )
+            if best is not None and box.match_percentage(best.bbox) > 0.6:
+                tracks.append(free.pop(best.id))
+            else:
+                tracks.append(None)
+        return tracks
+
+    def needs_liveness(self, track: Optional[Face], box: Box) -> bool:
+        # new faces, stale scores and faces that moved are scored again
+        if track is None or track.liveness_samples == 0:
+            return True
+        if (
+            self.frames - track.state.get("liveness_frame", 0)
+            >= settings.liveness_every_k
+        ):
+            return True
+        last_box = track.state.get("liveness_box")
+        return last_box is None or last_box.match_percentage(box) < LIVENESS_BOX_IOU
+
+
+class PipelineManager:
+    """
+    Keeps one CameraWorker per configured camera, restarting workers when the
+    camera list in the config changes, and publishes a registry of cameras
+    (ids, frame paths, stats) for server.py.
+    """
+
+    def __init__(self):
+        self.pool: Optional[InferencePool] = None
+        self.workers: dict[str, CameraWorker] = {}
+        # stopped workers whose thread has not exited yet
+        self.stopping: dict[str, CameraWorker] = {}
+
+    def sync(self):
+        cameras = {c.id: c for c in settings.camera_configs()}
+
+        for cid in list(self.workers):
+            worker = self.workers[cid]
+            if cid not in cameras or cameras[cid].source != worker.source:
+                print(f"Stopping camera {cid}")
+                worker.stop()
+                self.stopping[cid] = self.workers.pop(cid)
+
+        # a replacement would share the old worker's frame path and source
+        for cid, worker in list(self.stopping.items()):
+            if worker.join(timeout=5):
+                del self.stopping[cid]
+            else:
+                print(f"Camera {cid} is still stopping")
+
+        for cid, camera in cameras.items():
+            if cid not in self.workers and cid not in self.stopping:
+                worker = CameraWorker(camera, self.pool)  # type: ignore
+                worker.start()
+                self.workers[cid] = worker
+
+    def write_registry(self):
+        data = {
+            "cameras": [w.stats() for w in self.workers.values()],
+            "inference": self.pool.stats() if self.pool else {},
+            "recognition": recognition_pool.stats(),
+        }
+        try:
+            with open(cameras_path, "w") as f:
+                json.dump(data, f)
+            os.chmod(cameras_path, FILE_PERMS)
+        except Exception as e:
+            print(f"Camera registry write error: {e}")
+
+    def run(self):
+        # no-op when cam.py (or an earlier run) already started the pool
+        threading.Thread(target=recognize_faces).start()
+        self.pool = InferencePool(settings.inference_workers)
+        while should_run_thread.value:
+            try:
+                self.sync()
+                self.write_registry()
+            except Exception as e:
+                print(f"Error in pipeline manager: {e}")
+            time.sleep(1)
+
+        workers = list(self.workers.values()) + list(self.stopping.values())
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            worker.join(timeout=5)
@@ -0,0 +1,396 @@
+from multiprocessing import get_context, shared_memory
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+import cv2
+import numpy as np
+from core.onnx_runtime import LatencyHistogram
+from core.recognition_worker import recognition_worker, worker_main
+from models.helpers import Box
+from utils.constants import should_run_thread
+
+# lower runs first
+PRIORITY_NEW = 0  # a track seen for the first time
+PRIORITY_DOOR = 1  # re-check of a face standing in the door zone
+PRIORITY_RECHECK = 2  # re-check of any other tracked face
+
+# one RGB crop per worker; a full 1280x1280 frame fits, larger crops shrink
+SLOT_BYTES = 1280 * 1280 * 3
+
+
+# variance of the Laplacian below which a face crop counts as blurred
+SHARP_LAPLACIAN_VAR = 100.0
+
+
+def crop_quality(frame: np.ndarray, box: Box) -> float:
+    """
+    How good a crop of the face at ``box`` would be for encoding: the
+    shorter box side in pixels, scaled down when the face is blurred.
+    """
+    face = frame[max(0, box.top) : box.bottom, max(0, box.left) : box.right]
+    if face.size == 0:
+        return 0.0
+    gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY) if face.ndim == 3 else face
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    return min(face.shape[:2]) * min(1.0, sharpness / SHARP_LAPLACIAN_VAR)
+
+
+class TrackRecognition:
+    """
+    Recognition history of one tracked face, kept in its ``state``: the
+    last embedding with its best gallery distance and the gallery version
+    it was matched against, how often and when the face was encoded, the
+    best crop quality tried so far, and for a known face the quality of the
+    crop that matched it and how many re-verifications failed since.
+    """
+
+    def __init__(self):
+        self.embedding: Optional[np.ndarray] = None
+        self.distance = float("inf")
+        self.gallery_version = -1
+        self.attempts = 0
+        self.last_attempt = 0.0
+        self.best_quality = 0.0
+        self.last_quality = 0.0
+        self.matched_quality = 0.0
+        self.failures = 0
+
+    def due(
+        self,
+        now: float,
+        known: bool,
+        quality: float,
+        retry_base: float,
+        retry_max: float,
+        verify_interval: float,
+        quality_gain: float,
+    ) -> bool:
+        # known faces are re-verified on a fixed interval (0 = never), or
+        # after the unknown back-off while a failed verification is pending;
+        # unknown ones back off exponentially unless the crop got clearly better
+        if self.attempts == 0:
+            return True
+        elapsed = now - self.last_attempt
+        if known and self.failures:
+            return elapsed >= min(retry_max, retry_base * 2 ** (self.failures - 1))
+        if known:
+            return verify_interval > 0 and elapsed >= verify_interval
+        if quality > self.best_quality * quality_gain:
+            return True
+        return elapsed >= min(retry_max, retry_base * 2 ** (self.attempts - 1))
+
+    def attempt(self, now: float, quality: float):
+        self.attempts += 1
+        self.last_attempt = now
+        self.best_quality = max(self.best_quality, quality)
+        self.last_quality = quality
+
+    def result(self, embedding: np.ndarray, distance: float, gallery_version: int):
+        self.embedding = embedding
+        self.distance = distance
+        self.gallery_version = gallery_version
+
+    def matched(self):
+        self.failures = 0
+        self.matched_quality = self.last_quality
+
+    def verify_failed(self, demote_after: int) -> bool:
+        """
+        Count a failed re-verification of a known face. True when the track
+        should be demoted: after ``demote_after`` failures in a row, or at
+        once when the failing crop was at least as good as the one that
+        matched.
+        """
+        self.failures += 1
+        if self.failures >= demote_after or self.last_quality >= self.matched_quality:
+            self.failures = 0
+            return True
+        return False
+
+
+class RecognitionJob:
+    __slots__ = (
+        "id",
+        "key",
+        "priority",
+        "crop",
+        "box",
+        "landmarks",
+        "context",
+        "submitted",
+    )
+
+    def __init__(self, id, key, priority, crop, box, landmarks, context):
+        self.id: int = id
+        self.key: str = key
+        self.priority: int = priority
+        self.crop: np.ndarray = crop
+        self.box: Box = box
+        self.landmarks: Optional[np.ndarray] = landmarks
+        self.context: Any = context
+        self.submitted = time.perf_counter()
+
+
+class RecognitionPool:
+    """
+    Face encoding in a fixed set of worker processes. Each worker owns a
+    shared memory slot the crop is copied into, so only the job's shape,
+    box and landmarks are pickled.
+
+    Jobs wait in a bounded queue holding at most one job per key (a face
+    id): a newer crop of the same face replaces the queued one, and a face
+    already being encoded is not queued again. Workers take the lowest
+    priority number first, oldest first within a priority. When the queue
+    is full a job evicts the oldest job of a lower priority, or is dropped
+    if there is none. ``on_result(context, encoding)`` is called from the
+    pool's threads for every job, with None when encoding failed or the job
+    was dropped.
+
+    ``run`` blocks until should_run_thread is cleared, then stops the
+    workers, frees the shared memory and fails the jobs still queued. Jobs
+    submitted while no ``run`` is active are rejected, and a second ``run``
+    returns at once, so every entry point may start the pool.
+    """
+
+    def __init__(
+        self,
+        on_result: Callable[[Any, Optional[np.ndarray]], None],
+        queue_size: int = 8,
+    ):
+        self.on_result = on_result
+        self.queue_size = max(1, queue_size)
+        self.cond = threading.Condition()
+        self.pending: Dict[str, RecognitionJob] = {}
+        # job being encoded by each worker
+        self.busy: List[Optional[RecognitionJob]] = []
+        self.next_id = 0
+        # a run() call is active; running is set once its workers are up
+        self.started = False
+        self.running = False
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = {
+            "full": 0,
+            "evicted": 0,
+            "replaced": 0,
+            "in_flight": 0,
+            "not_running": 0,
+        }
+        self.wait_latency = LatencyHistogram()
+        self.encode_latency = LatencyHistogram()
+        self.total_latency = LatencyHistogram()
+
+    def submit(
+        self,
+        key: str,
+        crop: np.ndarray,
+        box: Box,
+        landmarks: Optional[np.ndarray] = None,
+        priority: int = PRIORITY_RECHECK,
+        context: Any = None,
+    ) -> bool:
+        accepted = True
+        evicted: Optional[RecognitionJob] = None
+        with self.cond:
+            self.submitted += 1
+            if not self.started:
+                self.dropped["not_running"] += 1
+                accepted = False
+            elif any(job is not None and job.key == key for job in self.busy):
+                self.dropped["in_flight"] += 1
+                return False
+            elif key in self.pending:
+                old = self.pending.pop(key)
+                # keep the newer crop at the more urgent of the two priorities
+                priority = min(priority, old.priority)
+                self.dropped["replaced"] += 1
+            elif len(self.pending) >= self.queue_size:
+                worst = max(self.pending.values(), key=lambda j: (j.priority, -j.id))
+                if worst.priority <= priority:
+                    self.dropped["full"] += 1
+                    accepted = False
+                else:
+                    evicted = self.pending.pop(worst.key)
+                    self.dropped["evicted"] += 1
+
+            if accepted:
+                self.next_id += 1
+                self.pending[key] = RecognitionJob(
+                    self.next_id, key, priority, crop, box, landmarks, context
+                )
+                self.cond.notify_all()
+
+        if evicted is not None:
+            self.on_result(evicted.context, None)
+        if not accepted:
+            self.on_result(context, None)
+        return accepted
+
+    def stats(self) -> dict:
+        with self.cond:
+            queued = list(self.pending.values())
+            return {
+                "started": self.started,
+                "running": self.running,
+                "workers": len(self.busy),
+                "busy": sum(job is not None for job in self.busy),
+                "queue_size": self.queue_size,
+                "queued": len(queued),
+                "queued_by_priority": {
+                    str(p): sum(j.priority == p for j in queued)
+                    for p in (PRIORITY_NEW, PRIORITY_DOOR, PRIORITY_RECHECK)
+                },
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "dropped": dict(self.dropped),
+                "queue_wait": self.wait_latency.to_dict(),
+                "encode": self.encode_latency.to_dict(),
+                "latency": self.total_latency.to_dict(),
+            }
+
+    def write_slot(self, slot: shared_memory.SharedMemory, job: RecognitionJob):
+        crop, box, landmarks = job.crop, job.box, job.landmarks
+        if crop.nbytes > SLOT_BYTES:
+            factor = (SLOT_BYTES / crop.nbytes) ** 0.5
+            height, width = crop.shape[:2]
+            size = (int(width * factor), int(height * factor))
+            crop = cv2.resize(crop, size, interpolation=cv2.INTER_AREA)
+            box = box.scale_copy(factor)
+            if landmarks is not None:
+                landmarks = landmarks * factor
+        view = np.ndarray(crop.shape, dtype=np.uint8, buffer=slot.buf)
+        view[...] = crop
+        del view
+        return (job.id, crop.shape, box, landmarks)
+
+    def run(self, workers: int = 1):
+        with self.cond:
+            if self.started:
+                return
+            self.started = True
+        try:
+            self.serve(max(1, workers))
+        finally:
+            with self.cond:
+                self.started = False
+                # queued jobs, and jobs whose result never came back
+                leftover = list(self.pending.values())
+                leftover += [job for job in self.busy if job is not None]
+                self.pending.clear()
+                self.busy = [None] * len(self.busy)
+                self.dropped["not_running"] += len(leftover)
+            for job in leftover:
+                self.on_result(job.context, None)
+
+    def serve(self, workers: int):
+        # spawn everywhere: forking a process full of camera threads is unsafe
+        ctx = get_context("spawn")
+        slots = [
+            shared_memory.SharedMemory(create=True, size=SLOT_BYTES)
+            for _ in range(workers)
+        ]
+        tasks = [ctx.Queue() for _ in range(workers)]
+        results = ctx.Queue()
+        stop = ctx.Event()
+
+        def start_worker(i: int):
+            process = ctx.Process(
+                target=recognition_worker,
+                args=(i, tasks[i], results, slots[i].name, stop),
+                name=f"recognition-{i}",
+                daemon=True,
+            )
+            with worker_main():
+                process.start()
+            return process
+
+        processes = [start_worker(i) for i in range(workers)]
+        with self.cond:
+            self.busy = [None] * workers
+            self.running = True
+        collector = threading.Thread(target=self.collect, args=(results,), daemon=True)
+        collector.start()
+        print(f"Started {workers} recognition worker process(es)")
+
+        try:
+            while should_run_thread.value:
+                for i, process in enumerate(processes):
+                    if process.is_alive():
+                        continue
+                    print(f"Recognition worker {i} exited, restarting")
+                    self.finish(i, None, None, "worker exited")
+                    processes[i] = start_worker(i)
+
+                with self.cond:
+                    if not self.pending or None not in self.busy:
+                        self.cond.wait(timeout=0.5)
+                        continue
+                    job = min(self.pending.values(), key=lambda j: (j.priority, j.id))
+                    del self.pending[job.key]
+                    i = self.busy.index(None)
+                    self.busy[i] = job
+                self.wait_latency.add(time.perf_counter() - job.submitted)
+                try:
+                    tasks[i].put(self.write_slot(slots[i], job))
+                except Exception as e:
+                    self.finish(i, job.id, None, str(e))
+        finally:
+            with self.cond:
+                self.running = False
+            stop.set()
+            for task_queue in tasks:
+                task_queue.put(None)
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+            collector.join(timeout=1)
+            for q in tasks + [results]:
+                q.close()
+                q.join_thread()
+            for slot in slots:
+                slot.close()
+                slot.unlink()
+            print("Recognition workers stopped")
+
+    def collect(self, results):
+        while self.running or any(job is not None for job in self.busy):
+            try:
+                i, job_id, encoding, error, seconds = results.get(timeout=0.5)
+            except queue.Empty:
+                if not self.running:
+                    return
+                continue
+            self.finish(i, job_id, encoding, error, seconds)
+
+    def finish(
+        self,
+        i: int,
+        job_id: Optional[int],
+        encoding: Optional[np.ndarray],
+        error: Optional[str],
+        seconds: float = 0.0,
+    ):
+        with self.cond:
+            job = self.busy[i]
+            # a result for a job a restarted worker already gave up on
+            if job is None or (job_id is not None and job.id != job_id):
+                return
+            self.busy[i] = None
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self.cond.notify_all()
+
+        if error is not None:
+            print(f"Recognition error: {error}")
+        else:
+            self.encode_latency.add(seconds)
+        self.total_latency.add(time.perf_counter() - job.submitted)
+        self.on_result(job.context, encoding)
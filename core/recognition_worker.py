@@ -0,0 +1,64 @@
+"""
+Entry module of the recognition worker processes. Kept to the imports the
+worker needs: spawned children re-import the parent's ``__main__``, and
+cam.py/server.py connect the database and start the config poller when
+imported.
+"""
+
+from contextlib import contextmanager
+from multiprocessing import parent_process, shared_memory
+import queue
+import sys
+import threading
+import time
+import numpy as np
+from core.face_encoding import encode_face
+
+_main_lock = threading.Lock()
+
+
+@contextmanager
+def worker_main():
+    """
+    Makes this module the ``__main__`` a process started inside the block
+    re-imports, instead of the script that launched the app.
+    """
+    with _main_lock:
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = sys.modules[__name__]
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main
+
+
+def recognition_worker(index, tasks, results, slot_name, stop):
+    """
+    Worker process: encodes the crops the pool writes into its shared memory
+    slot and sends the embeddings back. dlib holds the GIL of this process,
+    not the camera process's.
+    """
+    slot = shared_memory.SharedMemory(name=slot_name)
+    parent = parent_process()
+    try:
+        while not stop.is_set():
+            try:
+                task = tasks.get(timeout=0.5)
+            except queue.Empty:
+                if parent is not None and not parent.is_alive():
+                    break
+                continue
+            if task is None:
+                break
+
+            job_id, shape, box, landmarks = task
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=slot.buf)
+            start = time.perf_counter()
+            try:
+                encoding, error = encode_face(frame, box, landmarks), None
+            except Exception as e:
+                encoding, error = None, str(e)
+            del frame
+            results.put((index, job_id, encoding, error, time.perf_counter() - start))
+    finally:
+        slot.close()
@@ -0,0 +1,97 @@
+import socket
+import struct
+import time
+from typing import NamedTuple, Optional, Tuple
+import cv2
+import numpy as np
+from core.mjpeg import reduction_flag
+
+# magic, sequence, timestamp, width, height, codec, payload length
+HEADER = struct.Struct("!4sQdHHB3xI")
+MAGIC = b"HSF1"
+CODEC_JPEG = 1
+MAX_PAYLOAD = 32 * 1024 * 1024
+
+
+class FrameHeader(NamedTuple):
+    seq: int
+    timestamp: float
+    width: int
+    height: int
+    codec: int
+    length: int
+
+
+def pack_header(
+    seq: int, timestamp: float, width: int, height: int, length: int
+) -> bytes:
+    return HEADER.pack(MAGIC, seq, timestamp, width, height, CODEC_JPEG, length)
+
+
+def unpack_header(data) -> FrameHeader:
+    magic, *fields = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError(f"Bad frame magic: {bytes(magic)!r}")
+
+    header = FrameHeader(*fields)
+    if header.codec != CODEC_JPEG:
+        raise ValueError(f"Unsupported codec: {header.codec}")
+    if header.length > MAX_PAYLOAD:
+        raise ValueError(f"Frame too large: {header.length} bytes")
+    return header
+
+
+def send_frame(
+    sock: socket.socket, frame: np.ndarray, seq: int, quality: int = 80
+) -> int:
+    ok, jpg = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    if not ok:
+        raise ValueError("Could not encode frame")
+
+    h, w = frame.shape[:2]
+    sock.sendall(pack_header(seq, time.time(), w, h, len(jpg)))
+    sock.sendall(jpg.data)
+    return HEADER.size + len(jpg)
+
+
+class FrameReceiver:
+    """
+    Reads frames from a connected socket with recv_into, reusing one header
+    buffer and one payload buffer that only grows when a bigger frame arrives.
+    """
+
+    def __init__(self, sock: socket.socket, payload_size: int = 256 * 1024):
+        self.sock = sock
+        self.header_buf = bytearray(HEADER.size)
+        self.header_view = memoryview(self.header_buf)
+        self.payload_buf = bytearray(payload_size)
+        self.payload_view = memoryview(self.payload_buf)
+
+    def _recv_exact(self, view: memoryview):
+        received = 0
+        while received < len(view):
+            n = self.sock.recv_into(view[received:])
+            if n == 0:
+                raise ConnectionError("Server disconnected")
+            received += n
+
+    def recv(self) -> Tuple[FrameHeader, memoryview]:
+        # The returned payload view is only valid until the next call
+        self._recv_exact(self.header_view)
+        header = unpack_header(self.header_buf)
+
+        if header.length > len(self.payload_buf):
+            self.payload_buf = bytearray(header.length)
+            self.payload_view = memoryview(self.payload_buf)
+
+        payload = self.payload_view[: header.length]
+        self._recv_exact(payload)
+        return header, payload
+
+    def recv_frame(
+        self, target_width: int = 0
+    ) -> Tuple[FrameHeader, Optional[np.ndarray]]:
+        header, payload = self.recv()
+        flag, _ = reduction_flag(header.width, target_width)
+        frame = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), flag)
+        return header, frame
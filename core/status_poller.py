@@ -0,0 +1,76 @@
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+import requests
+from models.status import ESP32CameraStatusData
+from utils.constants import should_run_thread
+
+
+class StatusPoller:
+    """
+    Refreshes a camera's /status on one background thread. Readers get the
+    last snapshot and its age immediately and never wait on the camera.
+    """
+
+    def __init__(
+        self,
+        get_ip: Callable[[], str],
+        get_interval: Callable[[], float],
+        timeout: float = 2,
+    ):
+        self.get_ip = get_ip
+        self.get_interval = get_interval
+        self.timeout = timeout
+        self.snapshot: Optional[ESP32CameraStatusData] = None
+        self.updated_at = 0.0
+        self.last_error: Optional[str] = None
+        self.on_update: List[Callable[[ESP32CameraStatusData], None]] = []
+        self.running = False
+        self.session = requests.Session()
+        self.session.headers.update({"Connection": "keep-alive"})
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+    def get(self) -> Tuple[Optional[ESP32CameraStatusData], float]:
+        snapshot, updated_at = self.snapshot, self.updated_at
+        age = time.time() - updated_at if snapshot is not None else float("inf")
+        return snapshot, age
+
+    def refresh(self):
+        try:
+            response = self.session.get(
+                f"http://{self.get_ip()}/status", timeout=self.timeout
+            )
+            response.raise_for_status()
+            snapshot = ESP32CameraStatusData(**response.json())
+        except Exception as e:
+            self.last_error = str(e)
+            return
+
+        self.snapshot, self.updated_at = snapshot, time.time()
+        self.last_error = None
+        for callback in self.on_update:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Error in status callback: {e}")
+
+    def _run(self):
+        while self.running and should_run_thread.value:
+            start = time.time()
+            self.refresh()
+            time.sleep(max(0.1, self.get_interval() - (time.time() - start)))
+
+    def to_dict(self) -> dict:
+        _, age = self.get()
+        return {
+            "age": round(age, 2) if age != float("inf") else None,
+            "error": self.last_error,
+        }
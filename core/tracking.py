@@ -0,0 +1,125 @@
+from typing import Dict, Optional, Tuple
+import cv2
+import numpy as np
+from models.helpers import Box
+
+LK_PARAMS = dict(
+    winSize=(15, 15),
+    maxLevel=2,
+    criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03),
+)
+
+
+def transform_points(pts: np.ndarray, old: Box, new: Box) -> np.ndarray:
+    # Move points inside ``old`` the same way the box moved and scaled into ``new``
+    scale = np.array(
+        [new.width / max(old.width, 1), new.height / max(old.height, 1)], np.float32
+    )
+    old_c = np.array([old.left + old.right, old.top + old.bottom], np.float32) / 2
+    new_c = np.array([new.left + new.right, new.top + new.bottom], np.float32) / 2
+    return (pts - old_c) * scale + new_c
+
+
+class BoxTracker:
+    """
+    Propagates face boxes between detector keyframes with pyramidal
+    Lucas-Kanade optical flow on a small grayscale frame.
+
+    Each box is seeded with corner features; on every frame the surviving
+    points (forward-backward checked) give the box's median shift and scale.
+    The confidence of a track is the share of its points that survived.
+    """
+
+    def __init__(
+        self, width: int = 320, max_points: int = 40, fb_threshold: float = 1.0
+    ):
+        self.width = width
+        self.max_points = max_points
+        self.fb_threshold = fb_threshold
+        self.prev: Optional[np.ndarray] = None
+        self.scale = 1.0
+        self.points: Dict[str, np.ndarray] = {}
+        self.boxes: Dict[str, Box] = {}
+
+    def prepare(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        self.scale = self.width / w if w > self.width else 1.0
+        if self.scale != 1.0:
+            frame = cv2.resize(
+                frame, (self.width, round(h * self.scale)), interpolation=cv2.INTER_AREA
+            )
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+    def reset(self, gray: np.ndarray, boxes: Dict[str, Box]):
+        self.prev = gray
+        self.points = {}
+        self.boxes = dict(boxes)
+        for face_id, box in boxes.items():
+            b = box.scale_copy(self.scale)
+            mask = np.zeros_like(gray)
+            mask[max(0, b.top) : b.bottom, max(0, b.left) : b.right] = 255
+            pts = cv2.goodFeaturesToTrack(
+                gray, self.max_points, qualityLevel=0.01, minDistance=3, mask=mask
+            )
+            self.points[face_id] = (
+                pts.reshape(-1, 2) if pts is not None else np.empty((0, 2), np.float32)
+            )
+
+    def track(self, gray: np.ndarray) -> Dict[str, Tuple[Box, float]]:
+        results: Dict[str, Tuple[Box, float]] = {}
+        if self.prev is None or not self.points:
+            return results
+
+        ids = list(self.points)
+        counts = [len(self.points[i]) for i in ids]
+        if sum(counts) == 0:
+            return {i: (self.boxes[i], 0.0) for i in ids}
+
+        # one LK call for every track's points
+        p0 = np.concatenate([self.points[i] for i in ids]).astype(np.float32)
+        p1, st, _ = cv2.calcOpticalFlowPyrLK(
+            self.prev, gray, p0.reshape(-1, 1, 2), None, **LK_PARAMS  # type: ignore
+        )
+        back, st2, _ = cv2.calcOpticalFlowPyrLK(
+            gray, self.prev, p1, None, **LK_PARAMS  # type: ignore
+        )
+        p1 = p1.reshape(-1, 2)
+        fb = np.linalg.norm(p0 - back.reshape(-1, 2), axis=1)
+        good = (st.reshape(-1) == 1) & (st2.reshape(-1) == 1) & (fb < self.fb_threshold)
+
+        start = 0
+        for face_id, count in zip(ids, counts):
+            sl = slice(start, start + count)
+            start += count
+            keep = good[sl]
+            old_box = self.boxes[face_id]
+            if count == 0 or keep.sum() < 3:
+                results[face_id] = (old_box, 0.0)
+                self.points[face_id] = np.empty((0, 2), np.float32)
+                continue
+
+            a, b = p0[sl][keep], p1[sl][keep]
+            shift = np.median(b - a, axis=0) / self.scale
+            ca, cb = a.mean(axis=0), b.mean(axis=0)
+            da = np.linalg.norm(a - ca, axis=1)
+            db = np.linalg.norm(b - cb, axis=1)
+            valid = da > 1e-3
+            scale = float(np.median(db[valid] / da[valid])) if valid.any() else 1.0
+
+            cx = (old_box.left + old_box.right) / 2 + shift[0]
+            cy = (old_box.top + old_box.bottom) / 2 + shift[1]
+            half_w = old_box.width * scale / 2
+            half_h = old_box.height * scale / 2
+            box = Box(
+                top=int(round(cy - half_h)),
+                right=int(round(cx + half_w)),
+                bottom=int(round(cy + half_h)),
+                left=int(round(cx - half_w)),
+            )
+
+            self.boxes[face_id] = box
+            self.points[face_id] = b
+            results[face_id] = (box, float(keep.sum() / count))
+
+        self.prev = gray
+        return results
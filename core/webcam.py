@@ -1,40 +1,121 @@
 import cv2
 import atexit
 import socket
-import struct
 import numpy as np
 from urllib.parse import urlparse
 import threading
 import time
-import pickle
+from pathlib import Path
+from core.remote_protocol import FrameReceiver
 
 
-caps: dict[int | str, cv2.VideoCapture] = {}
 current_frame: dict[str, np.ndarray] = {}
+target_widths: dict[str, int] = {}
 lock = threading.Lock()
 
 
-def get_webcam_feed(index: str | int = 0, repeat: bool = False):
-    if index not in caps:
-        caps[index] = cv2.VideoCapture(index)
-        atexit.register(lambda: caps[index].release())
-    cap = caps[index]
+class FrameGrabber:
+    """
+    Continuously grab()s and retrieve()s frames from a VideoCapture on its own
+    thread so the driver buffer never backs up. Only that thread touches the
+    capture; read() hands out the newest decoded frame and never waits on the
+    camera.
+    """
+
+    def __init__(self, source: int | str, repeat: bool = False, realtime: bool = False):
+        self.source = source
+        self.repeat = repeat
+        self.cap = cv2.VideoCapture(source)
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread: threading.Thread | None = None
+
+        # files decode as fast as we grab, pace them at their own frame rate
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if realtime else 0
+        self.frame_interval = 1 / fps if fps and fps > 0 else 0
+
+        self.frame: np.ndarray | None = None
+        self.grabbed = 0
+        self.retrieved_seq = 0
+        self.dropped = 0
+        self.grab_time = 0.0
+        self.latency = 0.0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def release(self):
+        # the grab thread releases the capture once its current grab returns
+        self.running = False
+        if self.thread is None:
+            self.cap.release()
+
+    def _rewind(self):
+        # Seek back instead of reopening; fall back to reopening off the hot path
+        if not self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0):
+            self.cap.release()
+            self.cap.open(self.source)
+
+    def _run(self):
+        try:
+            while self.running:
+                start = time.time()
+                ok = self.cap.grab()
+                if ok:
+                    grab_time = time.time()
+                    ret, frame = self.cap.retrieve()
+                    if ret:
+                        with self.lock:
+                            self.grabbed += 1
+                            self.grab_time = grab_time
+                            self.frame = frame
+                elif self.repeat:
+                    self._rewind()
+
+                if not ok:
+                    time.sleep(0.05 if not self.repeat else 0.001)
+                elif self.frame_interval:
+                    time.sleep(max(0, self.frame_interval - (time.time() - start)))
+        finally:
+            self.cap.release()
 
-    if not cap.isOpened():
-        print(f"Error opening webcam {index}")
-        return None
+    def read(self) -> np.ndarray | None:
+        with self.lock:
+            seq = self.grabbed
+            if seq != self.retrieved_seq:
+                if self.retrieved_seq:
+                    self.dropped += seq - self.retrieved_seq - 1
+                self.retrieved_seq = seq
+                self.latency = time.time() - self.grab_time
+            return self.frame
 
-    ret, frame = cap.read()
-    if not ret and repeat:
-        cap.release()
-        cap.open(index)
-        ret, frame = cap.read()
+    def stats(self) -> dict:
+        return {
+            "grabbed": self.grabbed,
+            "dropped": self.dropped,
+            "latency_ms": round(self.latency * 1000, 1),
+        }
 
-    if not ret:
-        print(f"Error getting frame from webcam {index}")
+
+grabbers: dict[int | str, FrameGrabber] = {}
+
+
+def get_webcam_feed(index: str | int = 0, repeat: bool = False):
+    if index not in grabbers:
+        realtime = repeat or (isinstance(index, str) and Path(index).is_file())
+        grabber = FrameGrabber(index, repeat=repeat, realtime=realtime)
+        grabbers[index] = grabber
+        grabber.start()
+        atexit.register(grabber.release)
+    grabber = grabbers[index]
+
+    if not grabber.cap.isOpened():
+        print(f"Error opening webcam {index}")
         return None
 
-    return frame
+    return grabber.read()
 
 
 def _remote_webcam(url: str):
@@ -53,25 +134,14 @@ def _remote_webcam(url: str):
             client_socket.settimeout(None)
             print(f"Connected to {host_ip}:{port}")
 
-            data = b""
-            payload_size = struct.calcsize("Q")
+            receiver = FrameReceiver(client_socket)
 
             while True:
                 try:
-                    while len(data) < payload_size:
-                        packet = client_socket.recv(4 * 1024)
-                        if not packet:
-                            raise ConnectionError("Server disconnected")
-                        data += packet
-                    packed_msg_size = data[:payload_size]
-                    data = data[payload_size:]
-                    msg_size = struct.unpack("Q", packed_msg_size)[0]
-
-                    while len(data) < msg_size:
-                        data += client_socket.recv(4 * 1024)
-                    frame_data = data[:msg_size]
-                    data = data[msg_size:]
-                    frame = pickle.loads(frame_data)
+                    _, frame = receiver.recv_frame(target_widths.get(url, 0))
+                    if frame is None:
+                        print("Error decoding remote frame")
+                        continue
 
                     lock.acquire()
                     current_frame[url] = frame
@@ -110,7 +180,8 @@ def ping(url: str):
         return False
 
 
-def get_remote_webcam_feed(url: str):
+def get_remote_webcam_feed(url: str, target_width: int = 0):
+    target_widths[url] = target_width
     with lock:
         if url in current_frame:
             return current_frame[url]
@@ -1,5 +1,5 @@
 import time
-from typing import Literal, TypedDict, overload
+from typing import List, Literal, TypedDict, overload
 import json
 from utils.constants import app_path
 from pydantic import BaseModel
@@ -19,6 +19,19 @@ ConfigKeys = Literal[
     "face_detection_threshold",
     "show_video",
     "fps",
+    "inference_workers",
+    "frame_width",
+    "detect_every_n",
+    "recognition_width",
+    "liveness_every_k",
+    "liveness_min_samples",
+    "onnx_intra_op_threads",
+    "onnx_inter_op_threads",
+    "recognition_workers",
+    "recognition_queue_size",
+    "door_zone_near",
+    "ann_min_gallery",
+    "ann_nprobe",
 ]
 
 config_name = os.getenv("CONFIG_NAME", "esp32_config")
@@ -32,6 +45,13 @@ class FaceDetectionConfig(TypedDict):
     face_matching_threshold: float
 
 
+class CameraConfig(BaseModel):
+    id: str
+    # esp32, esp32://<ip>, rtsp://..., http://..., tcp://<host>:<port>, file path or index
+    source: str
+    enabled: bool = True
+
+
 class Config(BaseModel):
     esp32_ip: str = "192.168.0.52"
     liveness_threshold: float = 0.8
@@ -42,6 +62,70 @@ class Config(BaseModel):
     show_video: int = 0
     cam_str: str = "esp32"
     fps: int = 0
+    cameras: List[dict] = []
+    # detector/liveness instances shared by all cameras
+    inference_workers: int = 1
+    # width of the working frame detection, tracking and the preview run on
+    # (aspect is kept)
+    frame_width: int = 640
+    # opt-in: decode frames at this width instead of frame_width so liveness
+    # and encoding get sharper face crops, at the cost of a full-size decode
+    # of every frame; wider sources are kept whole and only the crops are
+    # scaled to it (0 = decode at frame_width, above the camera width =
+    # camera resolution)
+    recognition_width: int = 0
+    # esp32 network scan: probes in flight and per-probe timeout in seconds
+    discovery_concurrency: int = 32
+    discovery_timeout: float = 1.0
+    # seconds between background esp32 /status refreshes
+    status_poll_interval: float = 5.0
+    # mediapipe, facemesh, facemesh_tracking, yunet or haar (core/face_detection.py)
+    face_detector: str = "mediapipe"
+    # run the detector on every nth frame and track boxes with optical flow
+    # in between (1 = detect every frame); a track whose share of surviving
+    # flow points drops below track_min_confidence forces a new detection
+    detect_every_n: int = 5
+    track_min_confidence: float = 0.5
+    # share of a 64px thumbnail that must change to count as motion (0 turns
+    # the gate off); static scenes with no faces are only detected every
+    # idle_detect_interval seconds
+    motion_threshold: float = 0.005
+    idle_detect_interval: float = 2.0
+    # liveness is an EMA per tracked face; it is rescored every k frames or
+    # when the box moves, and the door needs liveness_min_samples scores
+    liveness_every_k: int = 10
+    liveness_ema_alpha: float = 0.3
+    liveness_min_samples: int = 3
+    # onnxruntime threads per session (0 = runtime default) and graph
+    # optimization: disable, basic, extended or all (core/onnx_runtime.py)
+    onnx_intra_op_threads: int = 0
+    onnx_inter_op_threads: int = 0
+    onnx_optimization: str = "all"
+    # float32 or int8 (built by scripts/quantize_liveness.py)
+    liveness_model: str = "float32"
+    # face encoding processes (fixed at start) and how many crops may wait
+    # for them; new faces and faces whose near_frame value is at most
+    # door_zone_near (closer) go before re-checks of other tracked faces
+    recognition_workers: int = 1
+    recognition_queue_size: int = 8
+    door_zone_near: int = 90
+    # unknown tracks are encoded again after recognition_retry_base seconds,
+    # doubling per attempt up to recognition_retry_max, or sooner when the
+    # crop quality beats the best tried by recognition_quality_gain times;
+    # known tracks are re-verified every recognition_verify_interval seconds
+    # (0 = never) and only marked unknown after recognition_demote_after
+    # failed re-verifications in a row, or one on a crop at least as good as
+    # the one that matched
+    recognition_retry_base: float = 0.5
+    recognition_retry_max: float = 30.0
+    recognition_quality_gain: float = 1.5
+    recognition_verify_interval: float = 60.0
+    recognition_demote_after: int = 3
+    # match against an approximate IVF index (core/ann_index.py) once the
+    # known gallery reaches ann_min_gallery faces (0 = always exact); more
+    # ann_nprobe lists means higher recall and slower lookups. Read at start
+    ann_min_gallery: int = 0
+    ann_nprobe: int = 16
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -87,6 +171,21 @@ class Config(BaseModel):
             except Exception as e:
                 print(f"Error saving config: {e}")
 
+    def camera_configs(self) -> List[CameraConfig]:
+        if not self.cameras:
+            return [CameraConfig(id="default", source=self.cam_str)]
+
+        cameras = []
+        for cam in self.cameras:
+            try:
+                camera = CameraConfig.model_validate(cam)
+            except Exception as e:
+                print(f"Invalid camera config {cam}: {e}")
+                continue
+            if camera.enabled:
+                cameras.append(camera)
+        return cameras
+
     def update(self, obj):
         updated = self.model_validate(obj)
         for key, value in updated.model_dump().items():
@@ -110,6 +209,19 @@ class Config(BaseModel):
             "max_face_detection",
             "show_video",
             "fps",
+            "inference_workers",
+            "frame_width",
+            "detect_every_n",
+            "recognition_width",
+            "liveness_every_k",
+            "liveness_min_samples",
+            "onnx_intra_op_threads",
+            "onnx_inter_op_threads",
+            "recognition_workers",
+            "recognition_queue_size",
+            "door_zone_near",
+            "ann_min_gallery",
+            "ann_nprobe",
         ],
         value: int,
     ): ...
@@ -133,6 +245,19 @@ class Config(BaseModel):
             "max_face_detection",
             "show_video",
             "fps",
+            "inference_workers",
+            "frame_width",
+            "detect_every_n",
+            "recognition_width",
+            "liveness_every_k",
+            "liveness_min_samples",
+            "onnx_intra_op_threads",
+            "onnx_inter_op_threads",
+            "recognition_workers",
+            "recognition_queue_size",
+            "door_zone_near",
+            "ann_min_gallery",
+            "ann_nprobe",
         ],
     ) -> int: ...
     def get(self, key: ConfigKeys):
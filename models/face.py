@@ -15,6 +15,16 @@ db.connect()
 atexit.register(db.disconnect)
 
 
+def record_face_change(client, face_id: str, deleted: bool = False):
+    """
+    Append to the FaceChange feed that core.face.load_faces follows. Pass a
+    batcher as ``client`` to commit the entry with the write it describes.
+    """
+    client.facechange.create(
+        data={"faceId": face_id, "action": "delete" if deleted else "upsert"}
+    )
+
+
 class Face(BaseModel):
     bbox: Box
 
@@ -22,6 +32,8 @@ class Face(BaseModel):
     name: str = "Unknown"
     created_at: datetime = datetime.now()
     liveness: float = 0.0
+    # number of liveness scores averaged into ``liveness``
+    liveness_samples: int = 0
     active: bool = True
 
     face_image_path: Optional[str] = None
@@ -46,18 +58,20 @@ class Face(BaseModel):
             raise ValueError("Face image path and embeddings path must be provided")
 
         print(f"Creating face {self.name}")
-        db.face.create(
-            data={
-                "id": self.id,
-                "name": self.name,
-                "liveness": self.liveness,
-                "bbox": json.dumps(self.bbox.model_dump()),
-                "face_image_path": self.face_image_path,
-                "face_embeddings_path": self.face_embeddings_path,
-                "is_unknown": self.is_unknown,
-                "last_seen": self.last_seen,
-            }
-        )
+        with db.batch_() as batcher:
+            batcher.face.create(
+                data={
+                    "id": self.id,
+                    "name": self.name,
+                    "liveness": self.liveness,
+                    "bbox": json.dumps(self.bbox.model_dump()),
+                    "face_image_path": self.face_image_path,
+                    "face_embeddings_path": self.face_embeddings_path,
+                    "is_unknown": self.is_unknown,
+                    "last_seen": self.last_seen,
+                }
+            )
+            record_face_change(batcher, self.id)
 
     def check_unknown(self):
         if "Unknown" in self.name:
@@ -67,9 +81,17 @@ class Face(BaseModel):
 
         return self.is_unknown
 
+    def update_liveness(self, score: float, alpha: float):
+        # exponential moving average over the track's liveness samples
+        if self.liveness_samples == 0:
+            self.liveness = score
+        else:
+            self.liveness = (1 - alpha) * self.liveness + alpha * score
+        self.liveness_samples += 1
+
     def live_update(self, other: "Face", update_face: bool = False):
+        # liveness is aggregated per track through update_liveness
         self.bbox = other.bbox
-        self.liveness = other.liveness
         self.near = other.near
         self.active = other.active
         self.last_seen = datetime.now()
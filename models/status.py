@@ -66,15 +66,18 @@ class ESP32CameraStatusData(BaseModel):
 
 
 class ESP32CameraStatus:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, timeout: float = 2):
         self.config = config
+        self.timeout = timeout
         data = self.load_status()
         self.data = ESP32CameraStatusData(**data)
 
     def load_status(self) -> Dict[str, int]:
         for _ in range(3):
             try:
-                response = requests.get(f"http://{self.config.esp32_ip}/status")
+                response = requests.get(
+                    f"http://{self.config.esp32_ip}/status", timeout=self.timeout
+                )
                 if response.ok:
                     return response.json()
             except requests.RequestException as e:
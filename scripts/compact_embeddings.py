@@ -0,0 +1,36 @@
+"""
+Reclaim the space of removed and superseded rows in the embedding store,
+and tombstone embeddings whose face no longer exists first. Stop cam.py and
+the server before running it: other processes keep reading the old rows.
+
+    python -m scripts.compact_embeddings
+"""
+
+import argparse
+from core.face import embedding_store
+from models.face import db
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compact the embedding store")
+    ap.add_argument(
+        "--keep-orphans",
+        action="store_true",
+        help="keep embeddings of faces missing from the database",
+    )
+    args = ap.parse_args()
+
+    if not args.keep_orphans:
+        face_ids = {face.id for face in db.face.find_many()}
+        ids, _ = embedding_store.live()
+        orphans = [face_id for face_id in ids if face_id not in face_ids]
+        for face_id in orphans:
+            embedding_store.remove(face_id)
+        print(f"Removed {len(orphans)} embeddings without a face")
+
+    before, after = embedding_store.compact()
+    print(f"Compacted {embedding_store.data_path}: {before} -> {after} rows")
+
+
+if __name__ == "__main__":
+    main()
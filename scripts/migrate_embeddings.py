@@ -0,0 +1,54 @@
+"""
+Move the per-face embedding pickles into the shared embedding store
+(core/embedding_store.py) and point each face's face_embeddings_path at it.
+Faces already in the store are skipped, so it is safe to run again.
+
+    python -m scripts.migrate_embeddings --delete-pickles
+"""
+
+import argparse
+from pathlib import Path
+import pickle
+from core.face import embedding_store
+from models.face import db
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Migrate embedding pickles to the store")
+    ap.add_argument(
+        "--delete-pickles",
+        action="store_true",
+        help="remove each pickle once its embedding is stored",
+    )
+    args = ap.parse_args()
+
+    store_path = str(embedding_store.data_path)
+    migrated = skipped = missing = 0
+    for face in db.face.find_many():
+        path = Path(face.face_embeddings_path)
+        if face.id in embedding_store:
+            skipped += 1
+        elif path.suffix == ".pkl" and path.is_file():
+            with open(path, "rb") as f:
+                embedding_store.append(face.id, pickle.load(f))
+            migrated += 1
+        else:
+            print(f"No embedding for {face.name} at {path}")
+            missing += 1
+            continue
+
+        if face.face_embeddings_path != store_path:
+            db.face.update(
+                where={"id": face.id}, data={"face_embeddings_path": store_path}
+            )
+        if args.delete_pickles and path.suffix == ".pkl":
+            path.unlink(missing_ok=True)
+
+    print(
+        f"Migrated {migrated} embeddings, {skipped} already stored, "
+        f"{missing} missing; store has {len(embedding_store)} faces"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Build an INT8 variant of the DeepPixBiS liveness model and report how far
+its scores and latency are from the float32 checkpoint.
+
+Static quantization calibrates activations on face crops saved by the camera
+process in img_folder; dynamic quantization only needs the weights. The
+model is written to deepPix_int8_checkpoint_path and the report next to it.
+Set liveness_model to "int8" in the config to use it.
+
+    python -m scripts.quantize_liveness --mode static --max-images 200
+"""
+
+import argparse
+import json
+from pathlib import Path
+import tempfile
+import time
+from typing import List
+import cv2
+import numpy as np
+import onnx
+from onnx import version_converter
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from core.face_liveness import INPUT_SIZE, preprocess
+from core.onnx_runtime import OnnxModel
+from utils.constants import (
+    deepPix_checkpoint_path,
+    deepPix_int8_checkpoint_path,
+    img_folder,
+)
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+# the convolutions carry the compute; batch norms stay float
+QUANTIZED_OPS = ["Conv", "Gemm", "MatMul"]
+
+
+def load_inputs(folder: Path, limit: int) -> List[np.ndarray]:
+    # crops are stored BGR; the pipeline hands liveness RGB crops
+    inputs = []
+    if not folder.is_dir():
+        return inputs
+    for path in sorted(folder.iterdir()):
+        if path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        img = cv2.imread(str(path))
+        if img is None:
+            continue
+        x = np.empty((1, 3, INPUT_SIZE, INPUT_SIZE), dtype=np.float32)
+        preprocess(cv2.cvtColor(img, cv2.COLOR_BGR2RGB), x[0])
+        inputs.append(x)
+        if len(inputs) >= limit:
+            break
+    return inputs
+
+
+class FaceCropReader(CalibrationDataReader):
+    def __init__(self, input_name: str, inputs: List[np.ndarray]):
+        self.input_name = input_name
+        self.inputs = iter(inputs)
+
+    def get_next(self):
+        x = next(self.inputs, None)
+        return None if x is None else {self.input_name: x}
+
+
+def scores(model: OnnxModel, inputs: List[np.ndarray]):
+    out = []
+    for x in inputs:
+        outputs = dict(zip(model.output_names, model.run({model.input_names[0]: x})))
+        out.append(
+            (outputs["output_pixel"].mean() + outputs["output_binary"].mean()) / 2.0
+        )
+    return np.array(out)
+
+
+def compare(
+    model_path: Path, int8_path: Path, evaluation: List[np.ndarray], threshold: float
+) -> dict:
+    # score agreement and latency of both models on the evaluation crops
+    latency = {}
+    results = {}
+    for name, path in (("float32", model_path), ("int8", int8_path)):
+        model = OnnxModel(path.as_posix())
+        model.run({model.input_names[0]: evaluation[0]})  # warm up
+        start = time.perf_counter()
+        results[name] = scores(model, evaluation)
+        latency[name] = model.latency.to_dict()
+        latency[name]["wall_s"] = round(time.perf_counter() - start, 3)
+
+    delta = np.abs(results["int8"] - results["float32"])
+    agree = (results["int8"] >= threshold) == (results["float32"] >= threshold)
+    return {
+        "score_delta": {
+            "mean": round(float(delta.mean()), 5),
+            "p95": round(float(np.percentile(delta, 95)), 5),
+            "max": round(float(delta.max()), 5),
+            "decision_agreement": round(float(agree.mean()), 4),
+            "threshold": threshold,
+        },
+        "latency": latency,
+        "speedup_p50": round(
+            latency["float32"]["p50_ms"] / max(latency["int8"]["p50_ms"], 1e-9), 2
+        ),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Quantize the liveness model to INT8")
+    ap.add_argument("--mode", choices=["static", "dynamic"], default="static")
+    ap.add_argument("--images", type=Path, default=img_folder)
+    ap.add_argument("--max-images", type=int, default=200)
+    ap.add_argument("--model", type=Path, default=deepPix_checkpoint_path)
+    ap.add_argument("--output", type=Path, default=deepPix_int8_checkpoint_path)
+    ap.add_argument(
+        "--threshold", type=float, default=0.8, help="liveness_threshold for the report"
+    )
+    args = ap.parse_args()
+
+    if not args.model.is_file():
+        raise SystemExit(f"{args.model} not found, run the camera process once first")
+    inputs = load_inputs(args.images, args.max_images)
+    if args.mode == "static" and len(inputs) < 2:
+        raise SystemExit(f"Need face crops in {args.images} to calibrate")
+
+    # calibrate on half the crops, report on the other half
+    split = len(inputs) // 2 if args.mode == "static" else 0
+    calibration, evaluation = inputs[:split], inputs[split:] or inputs
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepared = Path(tmp) / "prepared.onnx"
+        quant_pre_process(args.model.as_posix(), prepared.as_posix())
+        # per-channel scales need DequantizeLinear's axis attribute (opset 13)
+        model = onnx.load(prepared.as_posix())
+        opset = next(
+            o.version for o in model.opset_import if o.domain in ("", "ai.onnx")
+        )
+        if opset < 13:
+            model = version_converter.convert_version(model, 13)
+            onnx.save(model, prepared.as_posix())
+
+        if args.mode == "static":
+            reader = FaceCropReader(
+                OnnxModel(args.model.as_posix()).input_names[0], calibration
+            )
+            quantize_static(
+                prepared.as_posix(),
+                args.output.as_posix(),
+                reader,
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True,
+                op_types_to_quantize=QUANTIZED_OPS,
+            )
+        else:
+            quantize_dynamic(
+                prepared.as_posix(),
+                args.output.as_posix(),
+                weight_type=QuantType.QUInt8,
+                op_types_to_quantize=QUANTIZED_OPS,
+            )
+    # a fixed batch copy made for the previous variant is stale now
+    args.output.with_suffix(".dynamic.onnx").unlink(missing_ok=True)
+
+    report = {
+        "mode": args.mode,
+        "model": args.model.as_posix(),
+        "output": args.output.as_posix(),
+        "calibration_images": len(calibration),
+        "evaluation_images": len(evaluation),
+        "size_mb": {
+            "float32": round(args.model.stat().st_size / 2**20, 2),
+            "int8": round(args.output.stat().st_size / 2**20, 2),
+        },
+    }
+
+    if evaluation:
+        report.update(compare(args.model, args.output, evaluation, args.threshold))
+    else:
+        print(f"No face crops in {args.images}, skipping score and latency checks")
+
+    report_path = args.output.with_suffix(".report.json")
+    report_path.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+    print(f"Report written to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Serve a local camera to cam.py over the framed JPEG protocol in
+core/remote_protocol.py. Point the camera process at it with
+cam_str = "tcp://<this-host>:<port>".
+
+    python -m scripts.webcam_sender --source 0 --port 9999
+"""
+
+import argparse
+import socket
+import threading
+import time
+import cv2
+from core.remote_protocol import send_frame
+
+
+class LatestFrame:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.frame = None
+
+    def put(self, frame):
+        with self.cond:
+            self.seq += 1
+            self.frame = frame
+            self.cond.notify_all()
+
+    def wait_newer(self, seq: int, timeout: float = 1):
+        # None when no frame newer than ``seq`` arrived in time
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.seq > seq, timeout=timeout):
+                return None
+            return self.seq, self.frame
+
+
+def capture(source, latest: LatestFrame, fps: float):
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise SystemExit(f"Error opening camera {source}")
+
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            # loop file sources
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            time.sleep(0.01)
+            continue
+        latest.put(frame)
+        if fps:
+            time.sleep(1 / fps)
+
+
+def serve_client(conn: socket.socket, addr, latest: LatestFrame, quality: int):
+    print(f"Client connected: {addr}")
+    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    seq = 0
+    try:
+        while True:
+            newer = latest.wait_newer(seq)
+            if newer is None:
+                # never resend a frame the client already has
+                continue
+            seq, frame = newer
+            send_frame(conn, frame, seq, quality)
+    except OSError as e:
+        print(f"Client {addr} disconnected: {e}")
+    finally:
+        conn.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Serve a camera over the framed JPEG protocol"
+    )
+    ap.add_argument("--source", default="0", help="camera index, file or stream url")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=9999)
+    ap.add_argument("--quality", type=int, default=80, help="JPEG quality")
+    ap.add_argument("--fps", type=float, default=0, help="limit capture rate")
+    args = ap.parse_args()
+
+    source = int(args.source) if args.source.isnumeric() else args.source
+    latest = LatestFrame()
+    threading.Thread(
+        target=capture, args=(source, latest, args.fps), daemon=True
+    ).start()
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((args.host, args.port))
+    server.listen()
+    print(f"Serving {args.source} on {args.host}:{args.port}")
+
+    while True:
+        conn, addr = server.accept()
+        threading.Thread(
+            target=serve_client, args=(conn, addr, latest, args.quality), daemon=True
+        ).start()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import asyncio
+import json
 from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional, List
@@ -8,10 +9,15 @@ from fastapi.responses import FileResponse, JSONResponse
 from prisma import Prisma
 from prisma.types import FaceWhereInput
 from pydantic import BaseModel
-from core.face import load_faces, recognize_faces, save_face
+from core.face import embedding_store, load_faces, recognize_faces, save_face
 from models.helpers import Box
-from utils.constants import current_frame_path, should_process_video
-from models.face import db
+from utils.constants import (
+    cameras_path,
+    camera_frame_path,
+    current_frame_path,
+    should_process_video,
+)
+from models.face import db, record_face_change
 from fastapi.middleware.cors import CORSMiddleware
 import datetime as dt
 from cam import process_video_feed
@@ -28,9 +34,9 @@ from utils.helpers import base64_to_image, image_to_base64
 from multiprocessing import Value
 import uvicorn
 from models.config import Config, settings
-from models.status import ESP32CameraStatus
 from core.controller import (
     close_door,
+    get_status_poller,
     open_door,
     set_flash,
     set_servo_angle,
@@ -117,15 +123,20 @@ def get_camera(ip: str):
 
 @app.post("/api/faces/{face_id}/rename")
 async def rename_face(face_id: str, req: ChangeNameRequest):
-    face = db.face.update(
-        where={"id": face_id}, data={"name": req.name, "is_unknown": False}
-    )
-    return face
+    with db.batch_() as batcher:
+        batcher.face.update(
+            where={"id": face_id}, data={"name": req.name, "is_unknown": False}
+        )
+        record_face_change(batcher, face_id)
+    return db.face.find_unique(where={"id": face_id})
 
 
 @app.post("/api/faces/{face_id}/delete")
 async def delete_face(face_id: str):
-    db.face.delete(where={"id": face_id})
+    with db.batch_() as batcher:
+        batcher.face.delete(where={"id": face_id})
+        record_face_change(batcher, face_id, deleted=True)
+    embedding_store.remove(face_id)
     return {"message": "Face deleted"}
 
 
@@ -292,8 +303,43 @@ async def save_multiple_faces(req: FaceSaveRequest):
     return {"results": results}
 
 
-@app.websocket("/ws/video")
-async def video_websocket(websocket: WebSocket):
+def read_registry() -> dict:
+    try:
+        with open(cameras_path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def read_cameras() -> list[dict]:
+    return read_registry().get("cameras", [])
+
+
+def default_frame_path() -> Path:
+    cameras = read_cameras()
+    if cameras:
+        return Path(cameras[0]["frame_path"])
+    return current_frame_path
+
+
+@app.get("/api/cameras")
+def get_cameras():
+    return {"cameras": read_cameras()}
+
+
+@app.get("/api/inference")
+def get_inference_stats():
+    # per-call onnxruntime latency histograms, for tuning thread counts
+    return read_registry().get("inference", {})
+
+
+@app.get("/api/recognition")
+def get_recognition_stats():
+    # recognition worker backpressure: queue depth, drops and latencies
+    return read_registry().get("recognition", {})
+
+
+async def stream_frames(websocket: WebSocket, frame_path: Path):
     await websocket.accept()
     last_frame_hash = None
 
@@ -306,11 +352,11 @@ async def video_websocket(websocket: WebSocket):
                     continue
 
                 async with async_timeout.timeout(0.1):
-                    if not current_frame_path.exists():
+                    if not frame_path.exists():
                         continue
 
                     try:
-                        async with aiofiles.open(current_frame_path, "rb") as f:
+                        async with aiofiles.open(frame_path, "rb") as f:
                             frame_data = await f.read()
                     except PermissionError:
                         await asyncio.sleep(0.001)
@@ -345,6 +391,16 @@ async def video_websocket(websocket: WebSocket):
             await websocket.close()
 
 
+@app.websocket("/ws/video")
+async def video_websocket(websocket: WebSocket):
+    await stream_frames(websocket, default_frame_path())
+
+
+@app.websocket("/ws/video/{camera_id}")
+async def camera_video_websocket(websocket: WebSocket, camera_id: str):
+    await stream_frames(websocket, camera_frame_path(camera_id))
+
+
 @app.get("/api/config")
 def get_config():
     return settings.model_dump()
@@ -358,11 +414,12 @@ async def update_config(updates: Config):
 
 @app.get("/api/esp32/status")
 def get_esp32_status():
-    try:
-        status = ESP32CameraStatus(settings)
-        return status.data.model_dump()
-    except Exception as e:
-        return {"error": str(e)}
+    # served from the background poller's snapshot, never waits on the camera
+    poller = get_status_poller()
+    status, age = poller.get()
+    if status is None:
+        return {"error": poller.last_error or "Status not available yet"}
+    return {**status.model_dump(), "age": round(age, 2)}
 
 
 @app.post("/api/esp32/control")
@@ -29,6 +29,14 @@ img_folder = data_path / "imgs"
 create_dir_with_perms(img_folder)
 
 deepPix_checkpoint_path = checkpoints / "OULU_Protocol_2_model_0_0.onnx"
+# built locally by scripts/quantize_liveness.py
+deepPix_int8_checkpoint_path = checkpoints / "OULU_Protocol_2_model_0_0.int8.onnx"
+yunet_checkpoint_path = checkpoints / "face_detection_yunet_2023mar.onnx"
+# graphs saved by onnxruntime after optimization, keyed by model and options
+ort_cache_path = checkpoints / "ort_cache"
+
+# last addresses the esp32 camera answered on, probed first by discovery
+esp32_ips_path = data_path / "esp32_ips.json"
 
 em_path = data_path / "embeddings"
 create_dir_with_perms(em_path)
@@ -38,6 +46,12 @@ create_dir_with_perms(temp_dir)
 
 current_frame_path = temp_dir / "current_frame.jpg"
 frame_lock_path = temp_dir / "frame.lock"
+cameras_path = temp_dir / "cameras.json"
+
+
+def camera_frame_path(camera_id: str) -> Path:
+    return temp_dir / f"frame_{camera_id}.jpg"
+
 
 # Set initial permissions for frame files if they exist
 for file_path in [current_frame_path, frame_lock_path]:
@@ -1,22 +1,30 @@
-import torch
+from typing import Optional
 import cv2
 import numpy as np
-from torch.nn.functional import interpolate
 from models.helpers import Box
 
+# Where the eyes, nose tip and mouth center land in dlib's 150x150 face chip
+# (its mean face shape with the default 0.25 padding), which is what the
+# face_recognition encoder was trained on
+ALIGN_CHIP_SIZE = 150
+ALIGN_TEMPLATE = np.array(
+    [
+        [47.549, 46.599],
+        [100.476, 46.599],
+        [74.013, 76.563],
+        [74.013, 103.023],
+    ],
+    dtype=np.float32,
+)
+
 
 def get_size(img):
-    if isinstance(img, (np.ndarray, torch.Tensor)):
+    if isinstance(img, np.ndarray):
         return img.shape[1::-1]
     else:
         return img.size
 
 
-def imresample(img, sz):
-    im_data = interpolate(img, size=sz, mode="area")
-    return im_data
-
-
 def crop_resize(img: np.ndarray, box: Box, image_size):
     if box.right <= box.left or box.bottom <= box.top:
         return None
@@ -50,3 +58,52 @@ def extract_face(img: np.ndarray, box: Box, image_size=160, margin=0):
     except Exception as e:
         print(f"Error in extract_face: {e}")
         return None
+
+
+def landmarks_to_array(landmark_list, indices) -> np.ndarray:
+    """
+    Normalized x, y of the points at ``indices`` of a mediapipe
+    NormalizedLandmarkList as a (len(indices), 2) float32 array.
+    """
+    points = landmark_list.landmark
+    return np.array([(points[i].x, points[i].y) for i in indices], dtype=np.float32)
+
+
+def similarity_transform(src: np.ndarray, dst: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Least-squares rotation, uniform scale and translation mapping the points
+    ``src`` onto ``dst`` (Umeyama), as a 2x3 matrix; every point pair
+    contributes. None when ``src`` has no extent.
+    """
+    src = src.astype(np.float64)
+    dst = dst.astype(np.float64)
+    mu_src, mu_dst = src.mean(axis=0), dst.mean(axis=0)
+    src_c, dst_c = src - mu_src, dst - mu_dst
+    var_src = (src_c**2).sum() / len(src)
+    if var_src < 1e-12:
+        return None
+
+    U, S, Vt = np.linalg.svd(dst_c.T @ src_c / len(src))
+    d = np.ones(2)
+    if np.linalg.det(U) * np.linalg.det(Vt) < 0:
+        d[1] = -1  # a reflection fits better; keep the best rotation instead
+    R = (U * d) @ Vt
+    scale = (S * d).sum() / var_src
+    M = np.empty((2, 3))
+    M[:, :2] = scale * R
+    M[:, 2] = mu_dst - scale * R @ mu_src
+    return M
+
+
+def align_face(img: np.ndarray, landmarks: np.ndarray, size=ALIGN_CHIP_SIZE):
+    """
+    Warp the face described by ``landmarks`` (see ALIGN_TEMPLATE) into a
+    ``size`` x ``size`` chip with the similarity transform that fits all
+    four points best.
+    """
+    M = similarity_transform(landmarks, ALIGN_TEMPLATE * (size / ALIGN_CHIP_SIZE))
+    if M is None:
+        return None
+    return cv2.warpAffine(
+        img, M, (size, size), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE
+    )
@@ -90,18 +90,24 @@ def base64_to_image(base64_string: str) -> np.ndarray:
     return cv2.imdecode(arr, cv2.IMREAD_COLOR)
 
 
-def should_open_door(face: Face, liveness_threshold: float = 0.8) -> bool:
+def should_open_door(
+    face: Face, liveness_threshold: float = 0.8, min_samples: int = 3
+) -> bool:
     """
     Check if the door should be opened based on the face liveness.
 
     Args:
         face (Face): The face to check the liveness.
         liveness_threshold (float): The threshold to consider the face as real. Default is 0.8.
+        min_samples (int): Liveness scores the face's averaged liveness must be built from. Default is 3.
         near_threshold (float): The threshold to consider the face in front of the camera. Default is 80.
     """
     if face.check_unknown():
         return False
 
+    if face.liveness_samples < min_samples:
+        return False
+
     return face.liveness >= liveness_threshold
 
 